@@ -18,11 +18,7 @@ for name in ["checkerboard"]:
                 settings.append(setting)
 
 # Unocmment to rerun benchmarks. This takes a couple of hours.
-results = []
-for setting in settings:
-    result = lgr.benchmark(**setting)
-    results.append(result)
-    lgr.print_benchmark(result)
+results = lgr.run_sweep(settings, "benchmark_results_checkerboard.jsonl")
 
 with open("benchmark_results_checkerboard.pkl", "wb") as f:
     pickle.dump(results, f)
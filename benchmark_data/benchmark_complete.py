@@ -17,11 +17,7 @@ for name in ["complete"]:
                 }
                 settings.append(setting)
 
-results = []
-for setting in settings:
-    result = lgr.benchmark(**setting)
-    results.append(result)
-    lgr.print_benchmark(result)
+results = lgr.run_sweep(settings, "benchmark_results_complete.jsonl")
 
 with open("benchmark_results_complete.pkl", "wb") as f:
     pickle.dump(results, f)
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# Track the startup cost of line-graph routing. Every module is imported in a fresh interpreter, so that nothing is cached in sys.modules. Every run appends the median import times to benchmark_results_import_time.jsonl, so that regressions show up when comparing runs.
+import json
+import os
+import subprocess
+import sys
+from statistics import median
+from time import strftime
+from tabulate import tabulate
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+repetitions = 10
+modules = ["line_graph_routing", "lgr_lattices", "lgr_drawing", "lgr_benchmark"]
+
+
+def import_time(module):
+    # Wall-clock time in seconds of importing `module` in a fresh interpreter.
+    code = "from time import perf_counter; t = perf_counter(); import {}; print(perf_counter() - t)"
+    out = subprocess.run(
+        [sys.executable, "-c", code.format(module)],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return float(out.stdout.split()[-1])
+
+
+def heavy_imports(module):
+    # Return the names of the heavy dependencies that importing `module` loads.
+    code = "import sys, {}; print(' '.join(sorted(sys.modules)))"
+    out = subprocess.run(
+        [sys.executable, "-c", code.format(module)],
+        cwd=root,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(out.stdout.split())
+    heavy = ["matplotlib", "scipy.stats", "tabulate"]
+    return [name for name in heavy if name in loaded]
+
+
+table = []
+result = {"date": strftime("%Y-%m-%d %H:%M:%S"), "python": sys.version.split()[0]}
+for module in modules:
+    times = [import_time(module) for _ in range(repetitions)]
+    result[module] = median(times)
+    table.append(
+        [module, round(median(times), 3), round(min(times), 3)]
+        + [", ".join(heavy_imports(module))]
+    )
+
+print(tabulate(table, headers=["module", "median (s)", "min (s)", "heavy imports"]))
+
+with open("benchmark_results_import_time.jsonl", "a") as f:
+    f.write(json.dumps(result) + "\n")
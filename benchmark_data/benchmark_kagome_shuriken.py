@@ -20,11 +20,10 @@ for name in ["kagome", "shuriken"]:
 results = []
 for setting in settings:
     try:
-        result = lgr.benchmark(**setting)
-        results.append(result)
-        lgr.print_benchmark(result)
-    except:
-        print("Error occurred for", setting)
+        results += lgr.run_sweep([setting], "benchmark_results.jsonl")
+    except AssertionError as e:
+        # Raised, for example, by edge_coloring() if it finds no perfect matching.
+        print("Error occurred for", setting, e)
 
 with open("benchmark_results.pkl", "wb") as f:
     pickle.dump(results, f)
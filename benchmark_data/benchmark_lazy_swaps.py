@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# Compare the swap counts of line-graph routing with lazy swap-back (line_graph_route(qc, lazy=True)) to the swap counts of the line-graph rows stored in the benchmark pickles. The circuits are rebuilt with benchmark_circuit(), so only the deterministic quantum-simulation settings are compared.
+import os
+import pickle
+import sys
+from tabulate import tabulate
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, root)
+import line_graph_routing as lgr
+
+stores = ["kagome_shuriken.pkl", "checkerboard.pkl"]
+
+settings = {}
+for store in stores:
+    with open(os.path.join(root, "benchmark_data", store), "rb") as f:
+        results = pickle.load(f)
+    for key, rows in results:
+        name, size, circuit_type, p = key[:4]
+        if circuit_type != "quantum_simulation":
+            continue
+        row = next(row for row in rows if row["method"] == "line-graph")
+        settings[(name, size, p)] = row["num_swaps"]
+
+table = []
+for (name, size, p), stored in sorted(settings.items()):
+    qc, _ = lgr.benchmark_circuit(name, size, "quantum_simulation", p)
+    eager = lgr.line_graph_route(qc)
+    lazy = lgr.line_graph_route(qc, lazy=True)
+    swaps = lazy.count_ops().get("swap", 0)
+    table.append(
+        [
+            name,
+            size,
+            p,
+            stored,
+            swaps,
+            "{:.1f}".format(100 * (stored - swaps) / stored) if stored else "-",
+            eager.depth(),
+            lazy.depth(),
+        ]
+    )
+
+print(
+    tabulate(
+        table,
+        headers=[
+            "lattice",
+            "size",
+            "p",
+            "stored swaps",
+            "lazy swaps",
+            "saved (%)",
+            "depth",
+            "lazy depth",
+        ],
+    )
+)
@@ -16,11 +16,7 @@ for name in ["kagome", "shuriken"]:
             }
             settings.append(setting)
 
-results = []
-for setting in settings:
-    result = lgr.benchmark(**setting)
-    results.append(result)
-    lgr.print_benchmark(result)
+results = lgr.run_sweep(settings, "benchmark_results_other_methods.jsonl")
 
 with open("benchmark_results_other_methods.pkl", "wb") as f:
     pickle.dump(results, f)
@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# Micro-benchmarks of the stages of line-graph routing, the lattice generators and the edge colorings. Every stage is timed with perf_counter, after warm-up runs, as the minimum and median of repeated measurements. The stages on circuits are timed on heis_circuit() for kagome, shuriken and checkerboard patches of growing size (at p=1) and for growing p (on a patch of fixed size). Every run prints the scaling curves and the fitted complexity exponents, appends them to benchmark_results_stages.jsonl, and compares the medians to a stored baseline to flag regressions.
+#
+# Usage: python benchmark_stages.py [--sides 1 2 5 10 20 50] [--ps 1 10 100 1000] [--save-baseline] [--plot stages.png]
+# Timings depend on the machine, so run once with --save-baseline to store the baseline (benchmark_baseline_stages.json) on the machine that checks for regressions. The script exits with status 1 if any stage is more than --tolerance times slower than the baseline.
+import argparse
+import json
+import os
+import sys
+from statistics import median
+from time import perf_counter, strftime
+import numpy as np
+from tabulate import tabulate
+
+root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, root)
+import line_graph_routing as lgr
+import lgr_lattices as lat
+
+lattices = ["kagome", "shuriken", "checkerboard"]
+generators = {
+    "kagome": lat.kagome_lattice,
+    "shuriken": lat.shuriken_lattice,
+    "checkerboard": lat.checkerboard_lattice,
+}
+graphs = {
+    "kagome": lat.kagome,
+    "shuriken": lat.shuriken,
+    "checkerboard": lat.checkerboard,
+}
+
+
+def measure(func, warmup, repeat):
+    # Return the minimum and median wall-clock time of func() over `repeat` runs, after `warmup` runs.
+    for _ in range(warmup):
+        func()
+    times = []
+    for _ in range(repeat):
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+    return min(times), median(times)
+
+
+def lattice_stages(name, side):
+    # Return the number of edges of the lattice and the (stage, function) pairs that only depend on the lattice.
+    g = graphs[name](side, side)
+    stages = [
+        ("lattice generator", lambda: generators[name](side, side)),
+        ("networkx generator", lambda: graphs[name](side, side)),
+        ("lattice_coloring", lambda: lat.lattice_coloring(name, side, side)),
+    ]
+    try:
+        lat.edge_coloring(g.copy(), verbose=False)
+        stages.append(
+            ("edge_coloring", lambda: lat.edge_coloring(g.copy(), verbose=False))
+        )
+    except AssertionError:
+        # edge_coloring() raises if it does not find a perfect matching, as for even sizes.
+        pass
+    return g.number_of_edges(), stages
+
+
+def circuit_stages(name, side, p):
+    # Return the number of gates of heis_circuit() on the lattice and the (stage, function) pairs of routing it.
+    qc = lat.heis_circuit(lat.lattice_coloring(name, side, side), p)
+    cg = lgr.coupling_graph(qc)
+    cells = lgr.line_graph_cells(cg)
+    plan = lgr.RoutingPlan(cg, cells)
+    gates = list(lgr.reroute_gates(lgr.circuit_gates(qc), plan))
+    double = lgr.double_swaps(gates)
+    routed = lgr.fused_reroute(qc, plan)
+    stages = [
+        ("coupling_graph", lambda: lgr.coupling_graph(qc)),
+        ("inverse line graph", lambda: lgr.line_graph_cells(cg)),
+        ("heavy graph", lambda: lgr.heavy_graph(cg, cells)),
+        ("routing plan", lambda: lgr.RoutingPlan(cg, cells)),
+        ("reroute", lambda: list(lgr.reroute_gates(lgr.circuit_gates(qc), plan))),
+        ("lone leaves", lambda: lgr.lone_leaves(plan.h, plan.num_qubits)),
+        ("double swaps", lambda: lgr.double_swaps(gates)),
+        ("outer swaps", lambda: lgr.outer_swaps(gates, double)),
+        ("remove_idle_qwires", lambda: lgr.remove_idle_qwires(routed)),
+        ("line_graph_route", lambda: lgr.line_graph_route(qc, plan=plan)),
+    ]
+    return len(qc.data), stages
+
+
+def fit_exponent(points):
+    # Fit time = c * n^k to the largest half of the points (n, time), where constant overheads matter least. Return k.
+    points = sorted(points)[len(points) // 2 :]
+    if len(points) < 2 or points[0][0] == points[-1][0]:
+        return None
+    n, t = np.log(np.array(points)).T
+    return float(np.polyfit(n, t, 1)[0])
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--lattices", nargs="+", default=lattices)
+parser.add_argument("--sides", nargs="+", type=int, default=[1, 2, 5, 10, 20, 50])
+parser.add_argument("--ps", nargs="+", type=int, default=[1, 10, 100, 1000])
+parser.add_argument(
+    "--p-side", type=int, default=5, help="Side of the patch for the p axis."
+)
+parser.add_argument("--warmup", type=int, default=1)
+parser.add_argument("--repeat", type=int, default=5)
+parser.add_argument("--baseline", default="benchmark_baseline_stages.json")
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=1.5,
+    help="Flag stages slower than tolerance times the baseline.",
+)
+parser.add_argument("--save-baseline", action="store_true")
+parser.add_argument(
+    "--plot", default=None, help="Save the scaling curves to this image file."
+)
+args = parser.parse_args()
+
+records = []
+for name in args.lattices:
+    for side in args.sides:
+        n, stages = lattice_stages(name, side)
+        for stage, func in stages:
+            records.append(
+                {
+                    "lattice": name,
+                    "axis": "side",
+                    "side": side,
+                    "p": None,
+                    "stage": stage,
+                    "n": n,
+                    "time": measure(func, args.warmup, args.repeat),
+                }
+            )
+        n, stages = circuit_stages(name, side, 1)
+        for stage, func in stages:
+            records.append(
+                {
+                    "lattice": name,
+                    "axis": "side",
+                    "side": side,
+                    "p": 1,
+                    "stage": stage,
+                    "n": n,
+                    "time": measure(func, args.warmup, args.repeat),
+                }
+            )
+    for p in args.ps:
+        n, stages = circuit_stages(name, args.p_side, p)
+        for stage, func in stages:
+            records.append(
+                {
+                    "lattice": name,
+                    "axis": "p",
+                    "side": args.p_side,
+                    "p": p,
+                    "stage": stage,
+                    "n": n,
+                    "time": measure(func, args.warmup, args.repeat),
+                }
+            )
+    print("Measured", name, file=sys.stderr)
+
+# Scaling curves and fitted exponents, per lattice, axis and stage.
+curves = {}
+for r in records:
+    curves.setdefault((r["lattice"], r["axis"], r["stage"]), []).append(
+        (r["n"], r["time"][1])
+    )
+table = []
+exponents = {}
+for (name, axis, stage), points in curves.items():
+    k = fit_exponent(points)
+    exponents["/".join((name, axis, stage))] = k
+    curve = "  ".join("{}:{:.2e}".format(n, t) for n, t in points)
+    table.append([name, axis, stage, "-" if k is None else round(k, 2), curve])
+print(
+    tabulate(
+        table, headers=["lattice", "axis", "stage", "exponent", "size:median time (s)"]
+    )
+)
+
+
+def key(r):
+    return "/".join(str(r[x]) for x in ("lattice", "axis", "stage", "side", "p"))
+
+
+# Compare to the baseline.
+baseline_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), args.baseline)
+regressions = []
+if os.path.exists(baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    for r in records:
+        old = baseline.get(key(r))
+        if old is not None and r["time"][1] > args.tolerance * old:
+            regressions.append(
+                [key(r), old, r["time"][1], round(r["time"][1] / old, 2)]
+            )
+    if regressions:
+        print("\nRegressions (more than {} times the baseline):".format(args.tolerance))
+        print(
+            tabulate(regressions, headers=["stage", "baseline (s)", "now (s)", "ratio"])
+        )
+    else:
+        print("\nNo regressions against", args.baseline)
+if args.save_baseline:
+    with open(baseline_path, "w") as f:
+        json.dump({key(r): r["time"][1] for r in records}, f, indent=0)
+
+with open("benchmark_results_stages.jsonl", "a") as f:
+    result = {
+        "date": strftime("%Y-%m-%d %H:%M:%S"),
+        "python": sys.version.split()[0],
+        "records": records,
+        "exponents": exponents,
+    }
+    f.write(json.dumps(result) + "\n")
+
+if args.plot is not None:
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(
+        len(args.lattices), 2, figsize=(12, 4 * len(args.lattices)), squeeze=False
+    )
+    for row, name in enumerate(args.lattices):
+        for col, axis in enumerate(["side", "p"]):
+            ax = axes[row][col]
+            for (lattice, a, stage), points in curves.items():
+                if lattice == name and a == axis:
+                    n, t = zip(*points)
+                    ax.loglog(n, t, marker="o", label=stage)
+            ax.set_title("{}, growing {}".format(name, axis))
+            ax.set_xlabel("number of edges or gates")
+            ax.set_ylabel("median time (s)")
+    axes[0][0].legend(fontsize="small")
+    fig.tight_layout()
+    fig.savefig(args.plot)
+
+sys.exit(1 if regressions else 0)
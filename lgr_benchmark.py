@@ -0,0 +1,783 @@
+"""
+Benchmarks of line-graph routing against the routing methods of Qiskit and against OLSQ2. Imported lazily by line_graph_routing, so that the routing code can be imported without loading the Qiskit transpiler and tabulate.
+"""
+
+import networkx as nx
+import multiprocessing as mp
+import multiprocessing.connection
+import os
+import sys
+import json
+import pickle
+import tracemalloc
+import numpy as np
+from qiskit.transpiler import CouplingMap
+from qiskit.transpiler.preset_passmanagers import generate_preset_pass_manager
+from time import time, perf_counter
+from collections import OrderedDict
+from tabulate import tabulate
+
+try:
+    import resource
+except ImportError:  # Not available on Windows.
+    resource = None
+from line_graph_routing import (
+    RoutingStats,
+    coupling_graph,
+    plan_cache,
+    line_graph_route,
+    process_context,
+    remove_idle_qwires,
+    remove_swaps,
+)
+from lgr_lattices import (
+    kagome,
+    shuriken,
+    checkerboard,
+    edge_coloring,
+    heis_circuit,
+    random_circuit,
+)
+
+
+def benchmark_circuit(
+    name="kagome", size=(1, 1), circuit_type="quantum_simulation", p=1
+):
+    """
+    Return the circuit that is routed in a benchmark, together with the basis gates passed to the other routing methods. Parameters as in benchmark().
+    """
+    if name == "kagome":
+        lg = kagome(*size)
+    elif name == "shuriken":
+        lg = shuriken(*size)
+    elif name == "checkerboard":
+        lg = checkerboard(*size)
+    elif name == "complete":
+        lg = nx.complete_graph(size)
+
+    if circuit_type == "quantum_simulation":
+        lg = edge_coloring(lg, verbose=False)
+        qc = heis_circuit(lg, p)
+        basis_gates = ["swap", "singlet", "heis"]
+    elif circuit_type == "random":
+        qc = random_circuit(lg, p)
+        basis_gates = ["swap", "cx", "h", "s", "t"]
+
+    return qc, basis_gates
+
+
+def get_num_swaps(qc):
+    return qc.count_ops()["swap"]
+
+
+def start_memory() -> dict:
+    """
+    Start tracing memory allocations with tracemalloc, unless it is already tracing, and reset its peak. Return the state to pass to stop_memory(): the traced memory in use ("memory", in bytes), the number of traced blocks that are alive ("blocks"), and whether tracing was started here ("started").
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+        blocks = 0
+    else:
+        blocks = len(tracemalloc.take_snapshot().traces)
+    tracemalloc.reset_peak()
+    return {
+        "memory": tracemalloc.get_traced_memory()[0],
+        "blocks": blocks,
+        "started": started,
+    }
+
+
+def stop_memory(start: dict, peak: int = 0, stage_peaks=None) -> dict:
+    """
+    Finish a measurement of memory use that was begun by start_memory(), which returned `start`, and stop tracing memory allocations if start_memory() started it. Return a dict with the peak memory allocated since then ("peak_memory", in MB, also counting an earlier peak `peak` in bytes), the net number of memory blocks allocated since then that are still alive ("net_blocks"; not the number of allocations, since blocks that were freed again are not counted), the peak resident set size of the process so far ("max_rss", in MB, or None where the resource module is not available), and the dict `stage_peaks` of peak memory per stage in bytes, converted to MB ("stage_peak_memory").
+    """
+    peak = max(peak, tracemalloc.get_traced_memory()[1])
+    net_blocks = len(tracemalloc.take_snapshot().traces) - start["blocks"]
+    if start["started"]:
+        tracemalloc.stop()
+    max_rss = None
+    if resource is not None:
+        # ru_maxrss is in bytes on macOS and in kilobytes elsewhere.
+        scale = 2**20 if sys.platform == "darwin" else 2**10
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+    return {
+        "peak_memory": (peak - start["memory"]) / 2**20,
+        "net_blocks": net_blocks,
+        "max_rss": max_rss,
+        "stage_peak_memory": {
+            stage: value / 2**20 for stage, value in (stage_peaks or {}).items()
+        },
+    }
+
+
+def benchmark_line_graph(qc, repetitions=1, resamples=9999, seed=0, memory=False):
+    """
+    Line-graph route qc `repetitions` times, each time building the routing plan anew. Return the table row of the line-graph method in benchmark(), which includes the per-stage times and counters of RoutingStats (summed over the repetitions) as "stage_times" and "stage_counts", together with the coupling list of the routed circuit, which is the hardware coupling map for the other routing methods. The confidence intervals are computed by benchmark_row(), with `resamples` and `seed`; they are 0 for a single repetition. If memory==True, the memory use of every repetition is measured by start_memory() and stop_memory(), with the peak memory of every stage recorded by RoutingStats; this slows down routing.
+    """
+    stats = RoutingStats(memory=memory)
+    runs = []
+    for _ in range(repetitions):
+        plan_cache.clear()
+        if memory:
+            stats.peak = 0
+            mem_start = start_memory()
+        start = time()
+        qc_lgr = line_graph_route(qc, stats=stats)
+        end = time()
+        usage = stop_memory(mem_start, stats.peak, stats.peaks) if memory else None
+        runs.append(
+            (
+                np.round(end - start, 2),
+                qc_lgr.num_qubits,
+                get_num_swaps(qc_lgr),
+                qc_lgr.depth(),
+                0.0,
+                usage,
+            )
+        )
+    # print('line-graph routed:')
+    # print(qc_lgr.draw(fold=-1))
+
+    row = benchmark_row("line-graph", runs, resamples, seed)
+    row["stage_times"] = stats.times
+    row["stage_counts"] = stats.counts
+
+    # Convenient way of getting the target coupling graph.
+    cg_lgr = coupling_graph(qc_lgr)
+    cg_lgr = nx.convert_node_labels_to_integers(cg_lgr)
+    couplinglist = list(cg_lgr.edges)
+    couplinglist = couplinglist + [edge[::-1] for edge in cg_lgr.edges]
+    return row, couplinglist
+
+
+pass_manager_cache_size = 16
+pass_manager_cache = OrderedDict()
+
+
+def routing_pass_manager(method, couplinglist, basis_gates, optimization_level):
+    """
+    Return the pair (pm, wall_clock), with pm the preset pass manager that transpile() uses for the routing method `method` on the hardware coupling graph given by `couplinglist`, and wall_clock the time it took to build it. Pass managers are kept in the least-recently-used cache `pass_manager_cache`, keyed by the arguments, which holds at most `pass_manager_cache_size` pass managers; a cached pass manager is returned with wall_clock 0.
+    """
+    key = (
+        method,
+        tuple(tuple(edge) for edge in couplinglist),
+        tuple(basis_gates),
+        optimization_level,
+    )
+    if key in pass_manager_cache:
+        pass_manager_cache.move_to_end(key)
+        return pass_manager_cache[key], 0.0
+    start = perf_counter()
+    pm = generate_preset_pass_manager(
+        optimization_level,
+        coupling_map=CouplingMap(couplinglist=couplinglist),
+        basis_gates=basis_gates,
+        routing_method=method,
+    )
+    wall_clock = perf_counter() - start
+    pass_manager_cache[key] = pm
+    while len(pass_manager_cache) > pass_manager_cache_size:
+        pass_manager_cache.popitem(last=False)
+    return pm, wall_clock
+
+
+def seed_pass_manager(pm, seed):
+    """
+    Set the seed of every seeded pass (such as SabreLayout, SabreSwap and StochasticSwap) of the staged pass manager pm to `seed`, which has the same effect as passing seed_transpiler=seed to transpile().
+    """
+
+    def walk(passes):
+        # Yield the passes in the list `passes`, descending into flow controllers.
+        for p in passes:
+            inner = getattr(p, "passes", None)
+            if inner is not None:
+                yield from walk(inner if isinstance(inner, list) else [inner])
+            else:
+                yield p
+
+    for stage in pm.expanded_stages:
+        stage_pm = getattr(pm, stage)
+        if stage_pm is None:
+            continue
+        for group in stage_pm.passes():
+            for p in walk(group["passes"]):
+                if hasattr(p, "seed"):
+                    p.seed = seed
+
+
+def benchmark_repetition(
+    qc, method, couplinglist, basis_gates, optimization_level, seed=None, memory=False
+):
+    """
+    Route qc once with the Qiskit routing method `method` on the hardware coupling graph given by `couplinglist`, using the pass manager of routing_pass_manager() with the transpiler seed `seed`. Return the wall-clock time, number of qubits, number of swaps and depth of the result, and the time it took to build the pass manager, which is 0 if it was cached. The wall-clock time excludes building the pass manager. If memory==True, the memory use of running the pass manager is measured by start_memory() and stop_memory(), with the peak memory of every pass as stage peak, and returned as well (and None otherwise); this slows down routing.
+    """
+    pm, pm_wall_clock = routing_pass_manager(
+        method, couplinglist, basis_gates, optimization_level
+    )
+    seed_pass_manager(pm, seed)
+    if memory:
+        peaks = {}
+        mem_start = start_memory()
+        mem = {"current": mem_start["memory"], "peak": 0}
+
+        def record_pass(pass_, **kwargs):
+            # Record the peak memory of the pass that just ran, and reset the peak for the next pass.
+            current, peak = tracemalloc.get_traced_memory()
+            name = type(pass_).__name__
+            peaks[name] = max(peaks.get(name, 0), peak - mem["current"])
+            mem["current"] = current
+            mem["peak"] = max(mem["peak"], peak)
+            tracemalloc.reset_peak()
+
+    else:
+        record_pass = None
+    start = time()
+    qc_alt = pm.run(qc, callback=record_pass)
+    end = time()
+    usage = stop_memory(mem_start, mem["peak"], peaks) if memory else None
+    qc_alt = remove_idle_qwires(qc_alt)
+    qc_alt = remove_swaps(qc_alt)
+    # print('alt routed:')
+    # print(qc_alt.draw(fold=-1))
+    return (
+        np.round(end - start, 2),
+        qc_alt.num_qubits,
+        get_num_swaps(qc_alt),
+        qc_alt.depth(),
+        pm_wall_clock,
+        usage,
+    )
+
+
+def bootstrap_intervals(
+    samples, resamples=9999, confidence_level=0.95, seed=None
+) -> list:
+    """
+    Return the widths of the bootstrap confidence intervals of the means of the equally long sequences in the list `samples`. All sequences are resampled together, with a single matrix of resampling indices drawn from numpy.random.default_rng(seed), so that the intervals of all metrics of a method take one vectorized computation. The intervals are percentile intervals of `resamples` resampled means. Sequences of fewer than two values get width 0.
+    """
+    data = np.asarray(samples, dtype=float)
+    n = data.shape[1]
+    if n < 2:
+        return [0] * len(data)
+    rng = np.random.default_rng(seed)
+    index = rng.integers(0, n, size=(resamples, n))
+    means = data[:, index].mean(axis=2)
+    alpha = (1 - confidence_level) / 2
+    low, high = np.quantile(means, [alpha, 1 - alpha], axis=1)
+    return list(high - low)
+
+
+def benchmark_row(method, repetitions, resamples=9999, seed=0):
+    """
+    Return the table row of the routing method `method` in benchmark(), given the list `repetitions` of outputs of benchmark_repetition(). The time spent building pass managers is reported separately, as "pass_manager_wall_clock". If the repetitions measured memory use, the row also holds the largest "peak_memory", "max_rss" and "stage_peak_memory" (per stage) and the mean "net_blocks" over the repetitions. The confidence intervals of all metrics are computed together by bootstrap_intervals(), with `resamples` resamples and seed `seed`. If any repetition timed out, the row only records the number of repetitions that timed out.
+    """
+    timed_out = sum(rep == TIMED_OUT for rep in repetitions)
+    if timed_out:
+        return {"method": method, "timed_out": timed_out}
+
+    wall_clocks, num_qubits, num_swaps, depths = (
+        list(x) for x in zip(*(rep[:4] for rep in repetitions))
+    )
+    pm_wall_clock = sum(rep[4] for rep in repetitions if len(rep) > 4)
+    usages = [rep[5] for rep in repetitions if len(rep) > 5 and rep[5] is not None]
+    wall_clock_CI, num_qubits_CI, num_swaps_CI, depth_CI = bootstrap_intervals(
+        [wall_clocks, num_qubits, num_swaps, depths], resamples, seed=seed
+    )
+
+    min_run = depths.index(min(depths))
+    row = {
+        "method": method,
+        "num_swaps": num_swaps[-1],
+        "num_swaps_CI": num_swaps_CI,
+        "min_swaps": num_swaps[min_run],
+        "depth": np.mean(depths),
+        "depth_CI": depth_CI,
+        "min_depth": depths[min_run],
+        "num_qubits": np.mean(num_qubits),
+        "num_qubits_CI": num_qubits_CI,
+        "min_qubits": num_qubits[min_run],
+        "total_wall_clock": sum(wall_clocks),
+        "wall_clock": np.mean(wall_clocks),
+        "wall_clock_CI": wall_clock_CI,
+        "min_wall_clock": wall_clocks[min_run],
+        "pass_manager_wall_clock": pm_wall_clock,
+    }
+    if usages:
+        row["peak_memory"] = max(usage["peak_memory"] for usage in usages)
+        row["net_blocks"] = np.mean([usage["net_blocks"] for usage in usages])
+        rss = [usage["max_rss"] for usage in usages if usage["max_rss"] is not None]
+        row["max_rss"] = max(rss) if rss else None
+        stage_peaks = {}
+        for usage in usages:
+            for stage, value in usage["stage_peak_memory"].items():
+                stage_peaks[stage] = max(stage_peaks.get(stage, 0), value)
+        row["stage_peak_memory"] = stage_peaks
+    return row
+
+
+TIMED_OUT = "timed out"
+
+
+def run_worker(conn):
+    # Target of the worker processes of run_tasks(). Receive (func, args) pairs through the multiprocessing connection conn, and send back func(*args), or the exception it raised, until None is received. The worker lives for many tasks, so that caches such as pass_manager_cache are kept between them.
+    while True:
+        task = conn.recv()
+        if task is None:
+            break
+        func, args = task
+        try:
+            result = func(*args)
+        except Exception as e:
+            result = e
+        conn.send(result)
+    conn.close()
+
+
+def run_tasks(func, tasks, workers=1, timeout=None, callback=None) -> list:
+    """
+    Return the list [func(*args) for args in tasks]. If workers == 1 and timeout is None, the tasks are run in the current process. Otherwise, the tasks are run by at most `workers` worker processes, which run one task at a time and are reused for the next task, so that caches such as that of routing_pass_manager() are kept between the tasks of a worker. A worker that runs a task for more than `timeout` seconds is killed, and replaced by a new one for the next task, and the result of its task is TIMED_OUT. If given, callback(k, result) is called as soon as task k has finished.
+    """
+    results = [None] * len(tasks)
+    if workers == 1 and timeout is None:
+        for k, args in enumerate(tasks):
+            results[k] = func(*args)
+            if callback is not None:
+                callback(k, results[k])
+        return results
+
+    context = process_context("lgr_benchmark")
+
+    def start_worker():
+        conn, child_conn = context.Pipe()
+        process = context.Process(target=run_worker, args=(child_conn,))
+        process.start()
+        child_conn.close()
+        return process, conn
+
+    pending = list(enumerate(tasks))[::-1]
+    idle = []  # Workers waiting for a task.
+    running = {}
+    try:
+        while pending or running:
+            while pending and len(running) < workers:
+                k, args = pending.pop()
+                process, conn = idle.pop() if idle else start_worker()
+                conn.send((func, args))
+                running[k] = (process, conn, time())
+            ready = mp.connection.wait([conn for _, conn, _ in running.values()], 0.1)
+            for k, (process, conn, start) in list(running.items()):
+                if conn in ready:
+                    del running[k]
+                    try:
+                        result = conn.recv()
+                        idle.append((process, conn))
+                    except EOFError:
+                        process.join()
+                        result = RuntimeError("A worker process of run_tasks() died.")
+                    if isinstance(result, Exception):
+                        raise result
+                elif timeout is not None and time() - start > timeout:
+                    del running[k]
+                    process.kill()
+                    process.join()
+                    conn.close()
+                    result = TIMED_OUT
+                else:
+                    continue
+                results[k] = result
+                if callback is not None:
+                    callback(k, result)
+    finally:
+        for process, conn, _ in running.values():
+            process.kill()
+            process.join()
+        for process, conn in idle:
+            conn.send(None)
+            process.join()
+
+    return results
+
+
+BENCHMARK_DEFAULTS = {
+    "name": "kagome",
+    "size": (1, 1),
+    "circuit_type": "quantum_simulation",
+    "p": 1,
+    "repetitions": 16,
+    "optimization_level": 1,
+    "methods": ["sabre"],
+}
+
+
+def benchmark_many(
+    settings,
+    workers=1,
+    timeout=None,
+    callback=None,
+    resamples=9999,
+    seed=0,
+    lgr_repetitions=1,
+    memory=False,
+) -> list:
+    """
+    Run benchmark(**setting) for every dict `setting` in the list `settings` and return the list of results. The arguments `resamples`, `seed`, `lgr_repetitions` and `memory` are as in benchmark(). Repetition r of every routing method is seeded with seed + r, so that all repetitions are reproducible, also when run in parallel. The line-graph routing of all settings, and subsequently all repetitions of all other routing methods of all settings, are run concurrently by at most `workers` processes (see run_tasks()). A task that runs for more than `timeout` seconds is killed and recorded as timed out, so that, e.g., the method `lookahead` cannot hang the benchmark. With workers=1 and timeout=None, the results are the same as those of running benchmark() on each setting in sequence. If given, callback(k, result) is called as soon as all tasks of setting k have finished.
+    """
+    settings = [{**BENCHMARK_DEFAULTS, **setting} for setting in settings]
+    circuits = [
+        benchmark_circuit(s["name"], s["size"], s["circuit_type"], s["p"])
+        for s in settings
+    ]
+    results = [None] * len(settings)
+
+    def finish(k):
+        # Build the table of setting k.
+        setting = settings[k]
+        if lgr_results[k] == TIMED_OUT:
+            table = [{"method": "line-graph", "timed_out": 1}]
+            table += [
+                {"method": method, "timed_out": 1} for method in setting["methods"]
+            ]
+        else:
+            table = [lgr_results[k][0]]
+            for method in setting["methods"]:
+                table.append(benchmark_row(method, reps[(k, method)], resamples, seed))
+        option = [setting[key] for key in BENCHMARK_DEFAULTS if key != "methods"]
+        results[k] = (option, table)
+        if callback is not None:
+            callback(k, results[k])
+
+    # Line-graph route the circuits.
+    lgr_results = run_tasks(
+        benchmark_line_graph,
+        [(qc, lgr_repetitions, resamples, seed, memory) for qc, _ in circuits],
+        workers,
+        timeout,
+    )
+
+    # Route with the other methods, on the coupling graph of the line-graph routed circuits.
+    tasks = []
+    owners = []  # (setting, method, repetition) of every task.
+    reps = {}
+    remaining = [0] * len(settings)  # Number of unfinished tasks of every setting.
+    for k, (setting, (qc, basis_gates)) in enumerate(zip(settings, circuits)):
+        if lgr_results[k] == TIMED_OUT:
+            continue
+        couplinglist = lgr_results[k][1]
+        for method in setting["methods"]:
+            num_reps = 1 if method == "basic" else setting["repetitions"]
+            reps[(k, method)] = [None] * num_reps
+            for rep in range(num_reps):
+                tasks.append(
+                    (
+                        qc,
+                        method,
+                        couplinglist,
+                        basis_gates,
+                        setting["optimization_level"],
+                        None if seed is None else seed + rep,
+                        memory,
+                    )
+                )
+                owners.append((k, method, rep))
+                remaining[k] += 1
+
+    for k in range(len(settings)):
+        if remaining[k] == 0:
+            finish(k)
+
+    def collect(t, result):
+        k, method, rep = owners[t]
+        reps[(k, method)][rep] = result
+        remaining[k] -= 1
+        if remaining[k] == 0:
+            finish(k)
+
+    run_tasks(benchmark_repetition, tasks, workers, timeout, collect)
+
+    return results
+
+
+def benchmark(
+    name="kagome",
+    size=(1, 1),
+    circuit_type="quantum_simulation",
+    p=1,
+    repetitions=16,
+    optimization_level=1,
+    methods=["sabre"],
+    workers=1,
+    timeout=None,
+    resamples=9999,
+    seed=0,
+    lgr_repetitions=1,
+    memory=False,
+):
+    """
+    Run benchmark. Parameters as described in the notebook line_graph_routing.ipynb.
+    There is a bug in Qiskit causing the method `lookahead` to run for more than an hour even for the 1x1 kagome patch with a quantum simulation circuit of p=1.
+    Pass a timeout (in seconds) to record such runs as timed out instead, and workers > 1 to run the repetitions and methods in parallel processes. See benchmark_many() to also run many settings in parallel.
+    The confidence intervals are bootstrapped with `resamples` resamples, from a generator seeded with `seed` (see bootstrap_intervals()), and repetition r of the other routing methods is run with the transpiler seed seed + r. Pass seed=None for unseeded runs. The pass manager of every routing method is built once per process and reused across repetitions, also by the worker processes of workers > 1, which each route many repetitions (see run_tasks()); the total time spent building pass managers is reported as "pass_manager_wall_clock", and is not part of the wall-clock times. Line-graph routing is deterministic, but its wall-clock time is not; pass lgr_repetitions > 1 to time it repeatedly and obtain a confidence interval for it.
+    Pass memory=True to also measure the memory use of every routing method with tracemalloc: the peak memory allocated during the routing ("peak_memory"), the net number of memory blocks allocated during the routing that are still alive afterwards ("net_blocks"; tracemalloc does not count the allocations that are freed again, so this is not the number of allocations, which is not reported), the peak resident set size of the process that ran it ("max_rss"), and the peak memory of every stage of line-graph routing, or of every pass of the other methods ("stage_peak_memory"). Tracing that was already started by the caller is left running (with its peak reset). Tracing memory slows down routing considerably, so the wall-clock times of such runs should not be compared to those of runs without it. With workers=1, all methods run in the same process, so "max_rss" is the peak of the process up to that point.
+    """
+    setting = {
+        "name": name,
+        "size": size,
+        "circuit_type": circuit_type,
+        "p": p,
+        "repetitions": repetitions,
+        "optimization_level": optimization_level,
+        "methods": methods,
+    }
+    return benchmark_many(
+        [setting], workers, timeout, None, resamples, seed, lgr_repetitions, memory
+    )[0]
+
+
+def setting_key(setting) -> str:
+    """
+    Return a canonical string that identifies the benchmark setting `setting`, a dict of keyword arguments of benchmark(), with the defaults filled in.
+    """
+    return json.dumps({**BENCHMARK_DEFAULTS, **setting}, sort_keys=True)
+
+
+def to_json(obj):
+    # Default of json.dump for the numpy scalars in benchmark results.
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError("Object of type {} is not JSON serializable".format(type(obj)))
+
+
+def store_result(path, setting, result) -> None:
+    """
+    Append the benchmark result `result` of the dict `setting` as one JSON line to the file at `path`, and flush it to disk.
+    """
+    option, table = result
+    record = {
+        "setting": {**BENCHMARK_DEFAULTS, **setting},
+        "option": option,
+        "table": table,
+    }
+    line = json.dumps(record, default=to_json) + "\n"
+    with open(path, "a+b") as f:
+        # Start on a new line if the last line was only partly written.
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                line = "\n" + line
+        f.write(line.encode())
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def load_results(path) -> dict:
+    """
+    Return the benchmark results stored in the JSON-lines file at `path` as a dict that maps setting_key(setting) to the result of setting. Lines that cannot be parsed, such as a last line that was only partly written before a crash, are ignored. Returns an empty dict if the file does not exist.
+    """
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path) as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            option = record["option"]
+            if isinstance(option[1], list):
+                option[1] = tuple(option[1])
+            results[setting_key(record["setting"])] = (option, record["table"])
+    return results
+
+
+def run_sweep(
+    settings,
+    path,
+    workers=1,
+    timeout=None,
+    verbose=True,
+    resamples=9999,
+    seed=0,
+    lgr_repetitions=1,
+    memory=False,
+) -> list:
+    """
+    Run the benchmarks of the list `settings` of dicts of keyword arguments of benchmark(), and return their results in the same order. The result of every setting is appended to the JSON-lines file at `path` as soon as it has finished (see store_result()). Settings whose results are already in that file are not run again, so that an interrupted sweep can be resumed, and a sweep can be extended with new settings, by running it again. The arguments `workers`, `timeout`, `resamples`, `seed`, `lgr_repetitions` and `memory` are passed to benchmark_many(). If verbose==True, every new result is printed.
+    """
+    done = load_results(path)
+    keys = [setting_key(setting) for setting in settings]
+    todo = []
+    for k, key in enumerate(keys):
+        if key not in done and key not in (keys[t] for t in todo):
+            todo.append(k)
+
+    def store(t, result):
+        k = todo[t]
+        store_result(path, settings[k], result)
+        done[keys[k]] = result
+        if verbose:
+            print_benchmark(result)
+
+    benchmark_many(
+        [settings[k] for k in todo],
+        workers,
+        timeout,
+        store,
+        resamples,
+        seed,
+        lgr_repetitions,
+        memory,
+    )
+    return [done[key] for key in keys]
+
+
+def import_pickled_results(pkl_path, path) -> int:
+    """
+    Append the benchmark results in the pickle file at `pkl_path`, such as benchmark_data/kagome_shuriken.pkl, to the JSON-lines file at `path`, skipping settings whose results are already there. Return the number of results that were added.
+    """
+    with open(pkl_path, "rb") as f:
+        results = pickle.load(f)
+    done = load_results(path)
+    added = 0
+    for option, table in results:
+        setting = dict(
+            zip([key for key in BENCHMARK_DEFAULTS if key != "methods"], option)
+        )
+        setting["methods"] = [line["method"] for line in table[1:]]
+        if setting_key(setting) not in done:
+            store_result(path, setting, (option, table))
+            done[setting_key(setting)] = (option, table)
+            added += 1
+    return added
+
+
+def print_benchmark(result):
+    option, table = result
+    # table.sort(key=lambda x: x['num_swaps'])
+    formatted_table = []
+
+    def pm_format(lst, key, pm_key):
+        s = "{} \u00b1 {}".format(np.round(lst[key], 2), np.round(lst[pm_key] / 2, 2))
+        return s
+
+    memory = any("peak_memory" in line for line in table)
+    headers = [
+        "method",
+        "av. n_swaps",
+        "min. n_swap",
+        "av. depth",
+        "min. depth",
+        "av. n_qubits",
+        "min. qubits",
+        "total time (s)",
+        "av. time (s)",
+        "min. time (s)",
+    ]
+    if memory:
+        headers += ["peak mem. (MB)", "net blocks", "max RSS (MB)"]
+
+    for line in table:
+        if "timed_out" in line:
+            formatted_table.append([line["method"]] + [TIMED_OUT] * (len(headers) - 1))
+            continue
+        newline = [
+            line["method"],
+            pm_format(line, "num_swaps", "num_swaps_CI"),
+            line["min_swaps"],
+            pm_format(line, "depth", "depth_CI"),
+            line["min_depth"],
+            pm_format(line, "num_qubits", "num_qubits_CI"),
+            line["min_qubits"],
+            line["total_wall_clock"],
+            pm_format(line, "wall_clock", "wall_clock_CI"),
+            line["min_wall_clock"],
+        ]
+        if memory:
+            rss = line.get("max_rss")
+            newline += [
+                np.round(line.get("peak_memory", np.nan), 2),
+                np.round(line.get("net_blocks", np.nan)),
+                np.nan if rss is None else np.round(rss, 1),
+            ]
+        formatted_table.append(newline)
+
+    print_table = tabulate(formatted_table, headers=headers)
+
+    print("{\\tiny")
+    print("-" * 150)
+    print(
+        "name = {}, size = {}, circuit_type = {}, p = {}, repetitions = {}, optimization_level = {}".format(
+            *option
+        )
+    )
+    print()
+    print(print_table, flush=True)
+    if memory:
+        # The three stages with the largest peak memory, per method.
+        print()
+        for line in table:
+            peaks = sorted(
+                line.get("stage_peak_memory", {}).items(), key=lambda x: -x[1]
+            )[:3]
+            if peaks:
+                print(
+                    "peak mem. (MB) of {}: {}".format(
+                        line["method"],
+                        ", ".join(
+                            "{} {}".format(stage, np.round(value, 2))
+                            for stage, value in peaks
+                        ),
+                    )
+                )
+    print("-" * 150)
+    print("}")
+    print()
+
+
+def benchmark_against_OLSQ2(lg, p, obj_is_swap=False):
+    """
+    Benchmark against OLSQ2. Here, `lg` is the line graph on which a quantum simulation circuit is constructed and `p` is the number of Trotter steps in the circuit.
+    """
+    import sys
+
+    sys.path.insert(1, "OLSQ2")
+    from olsq import OLSQ
+    from olsq.device import qcdevice
+
+    qc = heis_circuit(lg, p, cnot_circ=True)
+
+    # Route with line graph routing
+    start = time()
+    rqc = line_graph_route(qc)
+    end = time()
+
+    lgr_result = {
+        "depth": rqc.depth(),
+        "num_swaps": rqc.count_ops()["swap"],
+        "num_qubits": rqc.num_qubits,
+        "wall_clock": end - start,
+    }
+
+    print(lgr_result)
+
+    # Route same circuit with OLSQ2
+    print("Routing the same circuit with OLSQ2")
+    cg = coupling_graph(rqc)
+    cg = nx.convert_node_labels_to_integers(cg)
+
+    mode = "normal"
+    encoding = 1
+    solver = OLSQ(obj_is_swap, mode, encoding)
+
+    qasm = qc.qasm()
+    solver.setprogram(qasm)
+
+    n = cg.number_of_nodes()
+    connection = list(cg.edges())
+    swap_duration = 1
+    device = qcdevice("kagome", n, connection, swap_duration)
+    solver.setdevice(device)
+    use_sabre = True
+    result = solver.solve(use_sabre)
+
+    print(result)
@@ -0,0 +1,32 @@
+"""
+Drawing of edge-colored lattices. Imported lazily by line_graph_routing, so that importing the routing code does not load matplotlib.
+"""
+
+import networkx as nx
+from matplotlib import pyplot as plt
+
+
+def draw_edge_coloring(g: nx.Graph, with_labels=False, spectral=False) -> None:
+    colors = [g[u][v]["color"] for u, v in g.edges]
+    if max(colors) <= 4:  # Specific to kagome
+        # Use custom edge colors
+        blue, orange, red, green, purple, grey = (
+            "#1f77b4",
+            "#ff7f0e",
+            "#2ca02c",
+            "#d62728",
+            "#9467bd",
+            "#d3d3d3",
+        )
+        color_map = {0: blue, 4: purple, 3: orange, 2: green, 1: red}
+        for ind, color in enumerate(colors):
+            colors[ind] = color_map[color]
+
+    if spectral == False:
+        nx.draw_kamada_kawai(
+            g, edge_color=colors, width=5, node_size=20, with_labels=with_labels
+        )
+    elif spectral == True:
+        nx.draw_spectral(
+            g, edge_color=colors, width=5, node_size=20, with_labels=with_labels
+        )
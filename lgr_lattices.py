@@ -0,0 +1,826 @@
+"""
+Lattice generators and example circuits for line-graph routing. Imported lazily by line_graph_routing, so that its functions are also available as lgr.kagome, lgr.heis_circuit, etc.
+"""
+
+import networkx as nx
+import numpy as np
+import random as rand
+import qiskit.circuit as qkcirc
+from qiskit import QuantumCircuit
+from qiskit.circuit import Parameter
+
+
+def kagome(n: int, m: int, to_ints: bool = True) -> nx.Graph:
+    """
+    Return the kagome graph of n by m unit cells, with 'padded' edges.
+    """
+    base_edges = [
+        ((0, 0, 0), (0, 0, 1)),
+        ((0, 0, 1), (0, 0, 2)),
+        ((0, 0, 2), (0, 0, 0)),
+        ((0, 0, 1), (1, 0, 0)),
+        ((1, 0, 0), (1, 0, 2)),
+        ((1, 0, 2), (1, 1, 0)),
+        ((0, 0, 2), (0, 1, 0)),
+        ((0, 1, 0), (0, 1, 1)),
+        ((0, 1, 1), (1, 1, 0)),
+        ((0, 1, 1), (1, 0, 2)),
+    ]
+
+    edges = []
+    for i in range(n):
+        for j in range(m):
+            for edge in base_edges:
+                v = edge[0]
+                w = edge[1]
+                _v = (v[0] + i, v[1] + j, v[2])
+                _w = (w[0] + i, w[1] + j, w[2])
+                _edge = (_v, _w)
+                edges.append(_edge)
+
+    g = nx.Graph(edges)
+    if to_ints:
+        g = nx.convert_node_labels_to_integers(g)
+    return g
+
+
+def shuriken(n: int, m: int) -> nx.Graph:
+    """
+    Return shuriken graph of n by m shurikens with open boundary conditions.
+    """
+    shuriken = [
+        (0, 1),
+        (1, 2),
+        (1, 3),
+        (2, 3),
+        (3, 4),
+        (3, 5),
+        (4, 5),
+        (5, 6),
+        (5, 7),
+        (6, 7),
+        (7, 0),
+        (7, 1),
+    ]
+    shuriken = nx.Graph(shuriken)
+
+    def new_shuriken(shuriken):
+        mapping = {i: i + 8 for i in shuriken.nodes}
+        ns = nx.relabel_nodes(shuriken, mapping)
+        return ns
+
+    def shuriken_column(n):
+        ns = shuriken  # New shuriken
+        col = shuriken.copy()  # One col of shuriken lattice
+        for row in range(1, n):
+            ns = new_shuriken(ns)
+            col.add_edges_from(ns.edges)
+            ln = (row - 1) * 8 + 6  # lower node of upper shuriken
+            un = row * 8 + 2  # Upper node of lower shuriken
+            col = nx.contracted_nodes(col, ln, un)
+
+        return col
+
+    def append_column(n, cols, newcol):
+        i_max = max(cols.nodes)
+        mapping = {i: i + i_max + 1 for i in newcol.nodes}
+        newcol = nx.relabel_nodes(newcol, mapping)
+        j_max = max(newcol.nodes)
+        cols.add_edges_from(newcol.edges)
+        mergers = [[(i_max - 3) - i * 8, j_max - 7 - i * 8] for i in range(n)]
+        for merger in mergers:
+            cols = nx.contracted_nodes(cols, *merger)
+
+        return cols
+
+    cols = shuriken_column(n)
+    for colind in range(1, m):
+        newcol = shuriken_column(n)
+        cols = append_column(n, cols, newcol)
+
+    cols = nx.convert_node_labels_to_integers(cols)
+    return cols
+
+
+def checkerboard(n: int, m: int) -> nx.Graph:
+    """
+    Return checkerbord graph of 2n by 2m unit cells, with open boundary conditions and padded edges.
+    """
+    n = int(
+        n * 2 + 1
+    )  # Go from size specification by unit cells to specification by nodes.
+    m = int(m * 2 + 1)
+    cb = nx.grid_2d_graph(n, m)
+    for i in range(0, n - 1, 2):
+        for j in range(0, m - 1, 2):
+            cb.add_edge((i, j), (i + 1, j + 1))
+            cb.add_edge((i + 1, j), (i, j + 1))
+    for i in range(1, n - 1, 2):
+        for j in range(1, m - 1, 2):
+            cb.add_edge((i, j), (i + 1, j + 1))
+            cb.add_edge((i + 1, j), (i, j + 1))
+
+    cb = nx.convert_node_labels_to_integers(cb)
+    return cb
+
+
+def heavy_square(n, m):
+    """
+    Return heavy square graph with padded edges.
+    """
+    base_edges = [
+        ((0, 0, 0), (0, 0, 1)),
+        ((0, 0, 0), (0, 0, 2)),
+        ((0, 0, 1), (1, 0, 0)),
+        ((1, 0, 0), (1, 0, 2)),
+        ((1, 0, 2), (1, 1, 0)),
+        ((1, 1, 0), (0, 1, 1)),
+        ((0, 1, 1), (0, 1, 0)),
+        ((0, 1, 0), (0, 0, 2)),
+    ]
+
+    edges = []
+    for i in range(n):
+        for j in range(m):
+            for edge in base_edges:
+                v = edge[0]
+                w = edge[1]
+                _v = (v[0] + i, v[1] + j, v[2])
+                _w = (w[0] + i, w[1] + j, w[2])
+                _edge = (_v, _w)
+                edges.append(_edge)
+
+    g = nx.Graph(edges)
+    g = nx.convert_node_labels_to_integers(g)
+    return g
+
+
+# The following generators return the same lattices as kagome(), shuriken(), checkerboard() and heavy_square(), up to the labels of the nodes, but compute the edges directly as an int array from the unit cell offsets, in time and memory linear in the number of edges.
+
+
+def lattice_output(edges: np.ndarray, output: str):
+    """
+    Return the lattice with the int array `edges` of shape (number of edges, 2) as given by `output`: "edges" returns the array itself, "networkx" an nx.Graph and "csr" the adjacency matrix as a scipy.sparse.csr_matrix.
+    """
+    if output == "edges":
+        return edges
+    elif output == "networkx":
+        g = nx.Graph()
+        g.add_nodes_from(range(edges.max() + 1))
+        g.add_edges_from(edges.tolist())
+        return g
+    elif output == "csr":
+        from scipy.sparse import csr_matrix
+
+        num_nodes = edges.max() + 1
+        rows = np.concatenate((edges[:, 0], edges[:, 1]))
+        cols = np.concatenate((edges[:, 1], edges[:, 0]))
+        data = np.ones(len(rows), dtype=np.int8)
+        return csr_matrix((data, (rows, cols)), shape=(num_nodes, num_nodes))
+    raise ValueError("output must be 'edges', 'networkx' or 'csr'.")
+
+
+def slot_labels(edges: np.ndarray, num_slots: int) -> np.ndarray:
+    """
+    Return an array that maps the nodes 0, ..., num_slots - 1 that are used by `edges` to 0, 1, ..., in increasing order, and all other nodes to -1.
+    """
+    used = np.zeros(num_slots, dtype=bool)
+    used[edges.ravel()] = True
+    return np.where(used, np.cumsum(used) - 1, -1)
+
+
+def compact_nodes(edges: np.ndarray, num_slots: int) -> np.ndarray:
+    """
+    Return `edges`, whose nodes are ints smaller than num_slots, with the nodes that are used relabeled to 0, 1, ..., in increasing order.
+    """
+    return slot_labels(edges, num_slots)[edges]
+
+
+def cell_edges(base_edges, n: int, m: int, slots: int):
+    """
+    Return the edges of n by m translated copies of the unit cell with edges `base_edges`, given as ((dx, dy, s), (dx, dy, s)) with (dx, dy) the offset of the cell and s the index of the node within the cell. Node (x, y, s) gets the label (x * (m + 1) + y) * slots + s. A base edge that coincides with another base edge of a neighbouring cell is only kept where that cell lies outside the patch, so that no edge is returned twice.
+
+    Returns the pair (edges, kinds), with kinds[k] = (b, x, y) if edge k is base edge b of the cell (x, y).
+    """
+    base = np.array(base_edges).reshape(-1, 2, 3)
+    x, y = np.divmod(np.arange(n * m), m)
+    keep = np.ones((n * m, len(base)), dtype=bool)
+    for b in range(len(base)):
+        for c in range(b):
+            for other in (base[c], base[c][::-1]):
+                d = base[b, :, :2] - other[:, :2]
+                if (base[b, :, 2] == other[:, 2]).all() and (d[0] == d[1]).all():
+                    # Base edge b of cell (x, y) is base edge c of cell (x, y) + d.
+                    inside = (x + d[0, 0] >= 0) & (x + d[0, 0] < n)
+                    inside &= (y + d[0, 1] >= 0) & (y + d[0, 1] < m)
+                    keep[inside, b] = False
+    dx, dy, s = base[..., 0], base[..., 1], base[..., 2]
+    # Shape (cells, base edges, 2).
+    nodes = ((x[:, None, None] + dx) * (m + 1) + (y[:, None, None] + dy)) * slots + s
+    kinds = np.stack(
+        np.broadcast_arrays(np.arange(len(base)), x[:, None], y[:, None]), axis=-1
+    )
+    return nodes[keep], kinds[keep]
+
+
+kagome_cell = [
+    ((0, 0, 0), (0, 0, 1)),
+    ((0, 0, 1), (0, 0, 2)),
+    ((0, 0, 2), (0, 0, 0)),
+    ((0, 0, 1), (1, 0, 0)),
+    ((1, 0, 0), (1, 0, 2)),
+    ((1, 0, 2), (1, 1, 0)),
+    ((0, 0, 2), (0, 1, 0)),
+    ((0, 1, 0), (0, 1, 1)),
+    ((0, 1, 1), (1, 1, 0)),
+    ((0, 1, 1), (1, 0, 2)),
+]
+
+heavy_square_cell = [
+    ((0, 0, 0), (0, 0, 1)),
+    ((0, 0, 0), (0, 0, 2)),
+    ((0, 0, 1), (1, 0, 0)),
+    ((1, 0, 0), (1, 0, 2)),
+    ((1, 0, 2), (1, 1, 0)),
+    ((1, 1, 0), (0, 1, 1)),
+    ((0, 1, 1), (0, 1, 0)),
+    ((0, 1, 0), (0, 0, 2)),
+]
+
+shuriken_cell = [
+    ((0, 0, 0), (0, 0, 1)),
+    ((0, 0, 1), (0, 0, 2)),
+    ((0, 0, 1), (0, 0, 3)),
+    ((0, 0, 2), (0, 0, 3)),
+    ((0, 0, 3), (0, 0, 4)),
+    ((0, 0, 3), (0, 0, 5)),
+    ((0, 0, 4), (0, 0, 5)),
+    ((0, 0, 5), (0, 0, 6)),
+    ((0, 0, 5), (0, 0, 7)),
+    ((0, 0, 6), (0, 0, 7)),
+    ((0, 0, 7), (0, 0, 0)),
+    ((0, 0, 7), (0, 0, 1)),
+]
+
+
+def kagome_edge_kinds(n: int, m: int):
+    """
+    Return the edges of kagome_lattice(n, m) together with their kinds, as returned by cell_edges().
+    """
+    edges, kinds = cell_edges(kagome_cell, n, m, 3)
+    return compact_nodes(edges, (n + 1) * (m + 1) * 3), kinds
+
+
+def heavy_square_edge_kinds(n: int, m: int):
+    """
+    Return the edges of heavy_square_lattice(n, m) together with their kinds, as returned by cell_edges().
+    """
+    edges, kinds = cell_edges(heavy_square_cell, n, m, 3)
+    return compact_nodes(edges, (n + 1) * (m + 1) * 3), kinds
+
+
+def shuriken_slots(n: int, m: int) -> np.ndarray:
+    """
+    Return the array that maps the node (x, y, s) of shuriken_cell, with label (x * (m + 1) + y) * 8 + s, to the label of the same node in the shuriken above or to the left, if it is shared with that shuriken, and to itself otherwise.
+    """
+    num_slots = (n + 1) * (m + 1) * 8
+    same = np.arange(num_slots)
+    x, y = np.divmod(np.arange(n * m), m)
+    cell = (x * (m + 1) + y) * 8
+    same[cell[x > 0] + 2] = ((x[x > 0] - 1) * (m + 1) + y[x > 0]) * 8 + 6
+    same[cell[y > 0] + 0] = (x[y > 0] * (m + 1) + y[y > 0] - 1) * 8 + 4
+    return same
+
+
+def shuriken_edge_kinds(n: int, m: int):
+    """
+    Return the edges of shuriken_lattice(n, m) together with their kinds, as returned by cell_edges().
+
+    Every shuriken has the nodes 0, ..., 7 of shuriken(1, 1). Node 2 of a shuriken is the same node as node 6 of the shuriken above it, and node 0 the same node as node 4 of the shuriken to its left.
+    """
+    edges, kinds = cell_edges(shuriken_cell, n, m, 8)
+    same = shuriken_slots(n, m)
+    return compact_nodes(same[edges], len(same)), kinds
+
+
+def checkerboard_edge_kinds(n: int, m: int):
+    """
+    Return the edges of checkerboard_lattice(n, m) together with their kinds (b, i, j). Here (i, j) is the upper left node of the edge in the grid of nodes, and b is 0 for horizontal, 1 for vertical and 2 and 3 for the two diagonal edges of a crossed square.
+    """
+    n = int(n * 2 + 1)
+    m = int(m * 2 + 1)
+    node = np.arange(n * m).reshape(n, m)
+    i, j = np.divmod(np.arange(n * m), m)
+    right = j < m - 1
+    down = i < n - 1
+    # Crossed squares are those with an upper left corner (i, j) with i and j both even or both odd.
+    crossed = right & down & ((i % 2) == (j % 2))
+    parts = [
+        (np.stack((node.ravel()[right], node.ravel()[right] + 1), axis=1), 0, right),
+        (np.stack((node.ravel()[down], node.ravel()[down] + m), axis=1), 1, down),
+        (
+            np.stack((node.ravel()[crossed], node.ravel()[crossed] + m + 1), axis=1),
+            2,
+            crossed,
+        ),
+        (
+            np.stack((node.ravel()[crossed] + m, node.ravel()[crossed] + 1), axis=1),
+            3,
+            crossed,
+        ),
+    ]
+    edges = np.concatenate([part for part, b, mask in parts])
+    kinds = np.concatenate(
+        [
+            np.stack((np.full(mask.sum(), b), i[mask], j[mask]), axis=1)
+            for part, b, mask in parts
+        ]
+    )
+    return edges, kinds
+
+
+# The cliques of the kagome and shuriken lattices that correspond to the nodes of their root graphs, as lists of nodes (dx, dy, s) of the unit cell at (0, 0).
+kagome_cliques = [
+    [(0, 0, 0), (0, 0, 1), (0, 0, 2)],
+    [(1, 0, 2), (1, 1, 0), (0, 1, 1)],
+]
+
+shuriken_cliques = [
+    [(0, 0, 7), (0, 0, 0), (0, 0, 1)],
+    [(0, 0, 1), (0, 0, 2), (0, 0, 3)],
+    [(0, 0, 3), (0, 0, 4), (0, 0, 5)],
+    [(0, 0, 5), (0, 0, 6), (0, 0, 7)],
+]
+
+
+def cell_cliques(cliques, n: int, m: int, label: np.ndarray) -> list:
+    """
+    Return the cliques `cliques` translated to the cells (x, y), with -1 <= x <= n and -1 <= y <= m, as tuples of nodes. Node (x, y, s) gets the label label[(x * (m + 1) + y) * slots + s], with slots = len(label) // ((n + 1) * (m + 1)). Nodes outside the patch or with label -1 are left out, as are cliques with fewer than two nodes left.
+    """
+    base = np.array(cliques)
+    slots = len(label) // ((n + 1) * (m + 1))
+    x, y = np.divmod(np.arange((n + 2) * (m + 2)), m + 2)
+    x = x[:, None, None] - 1 + base[..., 0]
+    y = y[:, None, None] - 1 + base[..., 1]
+    inside = (x >= 0) & (x <= n) & (y >= 0) & (y <= m)
+    nodes = np.where(inside, (x * (m + 1) + y) * slots + base[..., 2], 0)
+    nodes = np.where(inside, label[nodes], -1).reshape(-1, base.shape[1])
+    return [tuple(c[c >= 0].tolist()) for c in nodes if (c >= 0).sum() >= 2]
+
+
+def lattice_cells(name: str, n, m) -> list:
+    """
+    Return the root graph of the lattice `name` ("kagome", "shuriken" or "checkerboard") of n by m unit cells, as returned by kagome_lattice(n, m) etc., which is a line graph. The root graph is given by its cells, the cliques of the lattice formed by the edges at every node of the root graph, which can be passed to RoutingPlan() or routing_plan() to skip the computation of the inverse line graph.
+    """
+    if name == "kagome":
+        edges, kinds = cell_edges(kagome_cell, n, m, 3)
+        return cell_cliques(
+            kagome_cliques, n, m, slot_labels(edges, (n + 1) * (m + 1) * 3)
+        )
+    elif name == "shuriken":
+        edges, kinds = cell_edges(shuriken_cell, n, m, 8)
+        same = shuriken_slots(n, m)
+        return cell_cliques(
+            shuriken_cliques, n, m, slot_labels(same[edges], len(same))[same]
+        )
+    elif name == "checkerboard":
+        n = int(n * 2 + 1)
+        m = int(m * 2 + 1)
+        # The crossed squares, including those that stick out of the patch.
+        i, j = np.divmod(np.arange((n + 1) * (m + 1)), m + 1)
+        i, j = i - 1, j - 1
+        crossed = (i % 2) == (j % 2)
+        i, j = i[crossed, None] + [0, 0, 1, 1], j[crossed, None] + [0, 1, 0, 1]
+        inside = (i >= 0) & (i < n) & (j >= 0) & (j < m)
+        nodes = np.where(inside, i * m + j, -1)
+        return [tuple(c[c >= 0].tolist()) for c in nodes if (c >= 0).sum() >= 2]
+    raise ValueError(
+        "Root graphs are known for 'kagome', 'shuriken' and 'checkerboard'."
+    )
+
+
+def kagome_lattice(n: int, m: int, output: str = "edges"):
+    """
+    Return the kagome lattice of n by m unit cells, with 'padded' edges, as in kagome(). See lattice_output() for the argument `output`.
+    """
+    return lattice_output(kagome_edge_kinds(n, m)[0], output)
+
+
+def heavy_square_lattice(n: int, m: int, output: str = "edges"):
+    """
+    Return the heavy square lattice of n by m unit cells, with padded edges, as in heavy_square(). See lattice_output() for the argument `output`.
+    """
+    return lattice_output(heavy_square_edge_kinds(n, m)[0], output)
+
+
+def shuriken_lattice(n: int, m: int, output: str = "edges"):
+    """
+    Return the shuriken lattice of n by m shurikens with open boundary conditions, as in shuriken(). See lattice_output() for the argument `output`.
+    """
+    return lattice_output(shuriken_edge_kinds(n, m)[0], output)
+
+
+def checkerboard_lattice(n: int, m: int, output: str = "edges"):
+    """
+    Return the checkerboard lattice of 2n by 2m unit cells, with open boundary conditions and padded edges, as in checkerboard(). See lattice_output() for the argument `output`.
+    """
+    return lattice_output(checkerboard_edge_kinds(n, m)[0], output)
+
+
+def random_line_graph(n: int) -> nx.Graph:
+    """
+    Create an Erdos-Renyi graph on n nodes and return its line graph.
+    """
+    g = nx.erdos_renyi_graph(n, 2 / 3)  # Connected with high probability
+    while not nx.is_connected(g):
+        g = nx.erdos_renyi_graph(n, 2 * np.log(n) / n)
+    l = nx.line_graph(g)
+    l = nx.convert_node_labels_to_integers(l)
+    return l
+
+
+def random_circuit(g, m):
+    """
+    Return a qiskit quantum circuit with with connectivity graph g and m random 2-qubit Clifford + T gates.
+    """
+    if not all(type(node) == int for node in g.nodes):
+        print("warning: converting all nodes to integers")
+        g = nx.convert_node_labels_to_integers(g)
+    edges = list(g.edges)
+    n = len(g.nodes)
+    # List of gates to choose from. Make the prob. of choosing CNOT higher because these are the interesting gates in a routing problem.
+    gates = [qkcirc.library.CXGate()] * 2 + [
+        qkcirc.library.HGate(),
+        qkcirc.library.SGate(),
+        qkcirc.library.TGate(),
+    ]
+
+    def append_random_instruction_to(qc):
+        gate = rand.choice(gates)
+        qint = rand.randint(0, n - 1)
+        if gate.num_qubits == 1:
+            q = rand.randint(0, n - 1)
+            qc.append(gate, (q,))
+        elif gate.num_qubits == 2:
+            qs = rand.choice(edges)
+            qc.append(gate, qs)
+
+    qc = QuantumCircuit(n)
+
+    for _ in range(m):
+        append_random_instruction_to(qc)
+
+    return qc
+
+
+def pad_gate() -> QuantumCircuit:
+    """
+    The current implementation of line-graph routing assumes circuits with connected connectiviy graphs. The pad gate can be added to a circuit with a disconnected connectivity graph to make it connected.
+    """
+    qc = QuantumCircuit(2, name="pad")
+    return qc
+
+
+def prepare_singlet() -> QuantumCircuit:
+    """
+    Return qiskit circuit that prepares the two-qubit singlet state.
+    """
+    qc = QuantumCircuit(2, name="singlet")
+    qc.h(0)
+    qc.z(0)
+    qc.x(1)
+    qc.cnot(0, 1)
+    return qc
+
+
+def heis_gate(alpha: Parameter) -> QuantumCircuit:
+    """
+    Return HEIS gate as qiskit circuit with qiskit.circuit.Parameter alpha
+    """
+    qc = QuantumCircuit(2, name="heis")
+    qc.sx(1)
+    qc.rz(-np.pi, 0)
+    qc.sx(0)
+    qc.rz(-np.pi / 2, 0)
+    qc.cnot(0, 1)
+    qc.rx(np.pi / 2, 0)
+    qc.rz(-alpha / 2, 1)
+    qc.rz(np.pi / 2 + alpha / 2, 0)
+    qc.cnot(0, 1)
+    qc.rx(np.pi / 2, 0)
+    qc.rz(alpha / 2, 1)
+    qc.cnot(0, 1)
+    qc.x(0)
+    qc.x(1)
+    qc.rz(-np.pi / 2, 0)
+    return qc
+
+
+def edge_coloring(g: nx.Graph, verbose=True) -> nx.Graph:
+    """
+    Return an edge coloring of the networkx.Graph g as a networkx.Graph with 'color' edge attributes. Color 0 forms a perfect
+    matching. If such a perfect matching was not found (which does not mean it does not exist) an assertion error is raised.
+    Color 0 forms a perfect matching for many patches, including those of m x m unit cells, with m odd and arbitrarily large.
+    Does not return a perfect matching for all patches, for example patches with m x m unit cells with m even.
+    See color_edges() and lattice_coloring() for colorings that do not build the line graph and have a maximum matching as color 0 (for lattice_coloring(), on the patches described there).
+    """
+    line = nx.line_graph(g)
+    # To obtain an _edge_ coloring of g, we use the fact that a vertex coloring of the line graph of g is equivalent to an edge coloring of g.
+    coloring = nx.greedy_color(line, strategy="independent_set")
+    nx.set_edge_attributes(g, coloring, "color")
+    matching = {edge[:2] for edge in g.edges(data=True) if edge[2]["color"] == 0}
+    if nx.is_perfect_matching(g, matching):
+        if verbose == True:
+            print("Matching is perfect")
+    else:
+        raise AssertionError(
+            "No perfect matching found, try another method for coloring the graph."
+        )
+
+    colors = [g[u][v]["color"] for u, v in g.edges]
+    degree = max(dict(g.degree()).values())
+    if max(colors) == degree - 1:  # Specific to Vizing class I graphs
+        if verbose == True:
+            print("Edge coloring is minimal")
+    else:
+        if verbose == True:
+            print("Edge coloring is not minimal")
+    return g
+
+
+def color_edges(g: nx.Graph, matching=None, colors=None, verbose=False) -> nx.Graph:
+    """
+    Return an edge coloring of the networkx.Graph g as a networkx.Graph with 'color' edge attributes, without building the line graph of g. Color 0 is a maximum matching, which is perfect whenever g has a perfect matching. The matching is computed by nx.max_weight_matching(), which takes time cubic in the number of nodes, unless it is passed as `matching`, a set of edges that must form a maximum matching (otherwise color 0 is just that matching). The other edges are colored with the colors 1, 2, ... by the Misra-Gries algorithm, which uses at most one more color than the maximum degree of g without the matching. If `colors`, a dict that maps edges to the colors 1, 2, ..., is given, it must be a proper coloring of some of the other edges. This coloring is kept, and only the remaining edges are colored. Afterwards, the highest color is removed where possible by swapping the colors along alternating paths. Unlike edge_coloring(), no exception is raised if color 0 is not a perfect matching.
+    """
+    if matching is None:
+        matching = nx.max_weight_matching(g, maxcardinality=True)
+    matched = {frozenset(edge) for edge in matching}
+    rest = [(u, v) for u, v in g.edges if frozenset((u, v)) not in matched]
+    colors = colors or {}
+    degree = {}
+    for u, v in rest:
+        degree[u] = degree.get(u, 0) + 1
+        degree[v] = degree.get(v, 0) + 1
+    num_colors = max(
+        max(degree.values(), default=0) + 1, max(colors.values(), default=0)
+    )
+    palette = range(1, num_colors + 1)
+    # at[u][c] is the neighbour of u along the edge of color c, and color[u][v] the color of the edge (u, v).
+    at = {node: {} for node in g.nodes}
+    color = {node: {} for node in g.nodes}
+
+    def paint(u, v, c):
+        at[u][c] = v
+        at[v][c] = u
+        color[u][v] = color[v][u] = c
+
+    def unpaint(u, v):
+        c = color[u].pop(v)
+        del color[v][u], at[u][c], at[v][c]
+
+    def free(u):
+        return next(c for c in palette if c not in at[u])
+
+    def path_end(u, c, d):
+        # Return the last node of the path of alternating colors c, d, c, ... starting at u, together with the edges on the path.
+        path = []
+        while c in at[u]:
+            path.append((u, at[u][c], c))
+            u, c, d = at[u][c], d, c
+        return u, path
+
+    def swap_path(path, c, d):
+        for x, y, col in path:
+            unpaint(x, y)
+        for x, y, col in path:
+            paint(x, y, d if col == c else c)
+
+    for (u, v), c in colors.items():
+        paint(u, v, c)
+    for u, v in rest:
+        if v in color[u]:
+            continue
+        # Misra-Gries: build a maximal fan of u starting at v, invert a cd-path from u, and rotate the fan.
+        fan = [v]
+        while True:
+            last = fan[-1]
+            nxt = next(
+                (w for c, w in at[u].items() if w not in fan and c not in at[last]),
+                None,
+            )
+            if nxt is None:
+                break
+            fan.append(nxt)
+        c = free(u)
+        d = free(fan[-1])
+        swap_path(path_end(u, d, c)[1], c, d)
+        k = next(
+            k
+            for k in range(len(fan))
+            if d not in at[fan[k]]
+            and all(color[u][fan[j + 1]] not in at[fan[j]] for j in range(k))
+        )
+        shifted = [color[u][fan[j + 1]] for j in range(k)]
+        for j in range(1, k + 1):
+            unpaint(u, fan[j])
+        for j in range(k):
+            paint(u, fan[j], shifted[j])
+        paint(u, fan[k], d)
+
+    # Move the edges of the highest color to a lower color a, first freeing a at v by swapping the colors a and b on the path starting at v, if it does not end at u.
+    top = num_colors
+    for u, v in [(u, v) for u in at for c, v in at[u].items() if c == top]:
+        if color[u].get(v) != top:
+            continue
+        for a, b in (
+            (a, b)
+            for a in range(1, top)
+            if a not in at[u]
+            for b in range(1, top)
+            if b not in at[v]
+        ):
+            end, path = path_end(v, a, b)
+            if a == b or end != u:
+                swap_path(path, a, b)
+                unpaint(u, v)
+                paint(u, v, a)
+                break
+
+    h = g.copy()
+    for u, v in h.edges:
+        h[u][v]["color"] = 0 if frozenset((u, v)) in matched else color[u][v]
+    if verbose:
+        num_colors = 1 + max(c for u, v, c in h.edges(data="color"))
+        if 2 * len(matched) == g.number_of_nodes():
+            print("Matching is perfect")
+        else:
+            print("Matching is maximum, but not perfect")
+        if num_colors == max(dict(g.degree()).values()):
+            print("Edge coloring is minimal")
+        else:
+            print("Edge coloring is not minimal")
+    return h
+
+
+def augment_matching(g: nx.Graph, matching) -> set:
+    """
+    Return a matching of the networkx.Graph g that is at least as large as `matching`, a set of edges, by a breadth-first search for an augmenting path from every unmatched node. Blossoms are not contracted, so the result is a maximum matching if g is bipartite, but not necessarily otherwise. Fast if `matching` leaves few nodes unmatched.
+    """
+    mate = {}
+    for u, v in matching:
+        mate[u] = v
+        mate[v] = u
+    for root in g.nodes:
+        if root in mate:
+            continue
+        # Every node y reached by an unmatched edge is followed by its mate, so that the path to any unmatched y alternates.
+        parent = {root: None}
+        queue = [root]
+        found = None
+        for x in queue:
+            for y in g[x]:
+                if y in parent:
+                    continue
+                parent[y] = x
+                if y not in mate:
+                    found = y
+                    break
+                if mate[y] not in parent:
+                    parent[mate[y]] = y
+                    queue.append(mate[y])
+            if found is not None:
+                break
+        # Flip the matched and unmatched edges along the path from found back to root.
+        y = found
+        while y is not None:
+            x = parent[y]
+            mate[x] = y
+            mate[y] = x
+            y = parent[x]
+    return {tuple(edge) for edge in {frozenset(item) for item in mate.items()}}
+
+
+# Edge colorings of the lattices of kagome_edge_kinds(), heavy_square_edge_kinds(), shuriken_edge_kinds() and checkerboard_edge_kinds() with as many colors as their maximum degree. The color of an edge of kind (b, x, y) is table[b][x % period][y % period]. Entries -1 are never used.
+periodic_colorings = {
+    "kagome": [
+        [[0, 0], [1, 1]],
+        [[3, 3], [2, 2]],
+        [[1, 1], [3, 3]],
+        [[2, 2], [3, 3]],
+        [[3, 3], [1, 1]],
+        [[0, 0], [2, 2]],
+        [[2, 2], [-1, -1]],
+        [[0, 0], [2, 1]],
+        [[3, 2], [1, 3]],
+        [[1, 1], [0, 0]],
+    ],
+    "heavy_square": [[[1]], [[2]], [[3]], [[1]], [[0]], [[2]], [[1]], [[0]]],
+    "shuriken": [
+        [[0]],
+        [[3]],
+        [[2]],
+        [[1]],
+        [[3]],
+        [[0]],
+        [[1]],
+        [[2]],
+        [[3]],
+        [[0]],
+        [[2]],
+        [[1]],
+    ],
+    "checkerboard": [
+        [[2, 5], [2, 5]],
+        [[4, 1], [1, 4]],
+        [[3, -1], [-1, 0]],
+        [[0, -1], [-1, 3]],
+    ],
+}
+
+
+def lattice_coloring(name: str, n, m, verbose=False) -> nx.Graph:
+    """
+    Return the lattice `name` ("kagome", "heavy_square", "shuriken" or "checkerboard") of n by m unit cells, as returned by kagome_lattice(n, m, "networkx") etc., with an edge coloring as 'color' edge attributes. Color 0 is a large matching, see below.
+
+    The lattice is first colored with the unit-cell periodic coloring in periodic_colorings, in time linear in the number of edges. This coloring uses as many colors as the maximum degree of the lattice, and its color classes are matchings that cover all nodes of maximum degree. The color class that matches the most nodes is made color 0. If it leaves nodes at the boundary of the patch unmatched, it is enlarged by augment_matching(), which searches for an augmenting path from every unmatched node. The search does not contract blossoms, so the matching is certainly maximum only if the lattice is bipartite or at most one node is unmatched; for all four lattices it was checked to be maximum for every patch of up to 12 by 12 unit cells. The edges that leave color 0 are then recolored by color_edges(), keeping the colors of all other edges. Since color 0 still covers all nodes of maximum degree, at most one more color than the maximum degree is used. For the patches up to 12 by 12 unit cells only heavy_square(1, 1), a path, needs that extra color. Apart from the augmenting-path searches, which only start at unmatched boundary nodes, the time is linear in the number of edges.
+    """
+    cells = {
+        "kagome": kagome_edge_kinds,
+        "heavy_square": heavy_square_edge_kinds,
+        "shuriken": shuriken_edge_kinds,
+        "checkerboard": checkerboard_edge_kinds,
+    }[name]
+    edges, kinds = cells(n, m)
+    table = np.array(periodic_colorings[name])
+    period = table.shape[1]
+    colors = table[kinds[:, 0], kinds[:, 1] % period, kinds[:, 2] % period]
+    assert (colors >= 0).all()
+    num_nodes = edges.max() + 1
+    covered = [np.unique(edges[colors == c]).size for c in range(table.max() + 1)]
+    zero = int(np.argmax(covered))
+    # Swap the colors zero and 0.
+    colors = np.where(colors == zero, 0, np.where(colors == 0, zero, colors))
+    g = lattice_output(edges, "networkx")
+    edges = list(map(tuple, edges.tolist()))
+    if num_nodes - covered[zero] <= 1:
+        nx.set_edge_attributes(g, dict(zip(edges, colors.tolist())), "color")
+        if verbose:
+            print(
+                "Matching is perfect" if num_nodes % 2 == 0 else "Matching is maximum"
+            )
+            print("Edge coloring is minimal")
+        return g
+
+    matching = augment_matching(g, [e for e, c in zip(edges, colors) if c == 0])
+    matched = {frozenset(edge) for edge in matching}
+    kept = {
+        e: c
+        for e, c in zip(edges, colors.tolist())
+        if c != 0 and frozenset(e) not in matched
+    }
+    return color_edges(g, matching, kept, verbose=verbose)
+
+
+def heis_circuit(g: nx.Graph, p: int, cnot_circ: bool = False) -> QuantumCircuit:
+    """
+    Return parameterized ansatz qiskit circuit for the HAFM on the networkx.Graph g, with p cycles. The edges
+    of g must have a 'color' attribute that specifies the color by an int, the lowest color being 0. Singlets
+    are created along those edges with color 0. Subsequently, HEIS gates are added for the colors c-1,..., 0 in
+    sequence, with c the number of different edge colors. This (excluding singlet preparation) is repeated p times.
+    This means that for $p = 0$, only the initial state is prepared.
+
+    Every cycle consists of g.number_of_edges() gates, which can be passed as `period` to line_graph_route() to route the circuit in a time independent of p.
+
+    If cnot_circ==True, each gate is a cnot. This results to a circtuit structurally equivalent to the heis_circtuit. Mainly for interfacing with OLSQ2.
+    """
+    n = len(g.nodes())
+    edges = list(g.edges(data=True))
+    edges = [
+        edge if edge[0] < edge[1] else (edge[1], edge[0], edge[2]) for edge in edges
+    ]
+    # Sort edges by color.
+    sorted_edges = sorted(edges, key=lambda e: e[2]["color"])
+    sorted_edges = list(reversed(sorted_edges))  # Put 'high' colors first.
+    qc = QuantumCircuit(n)
+
+    # Prepare the initial state.
+    for edge in sorted_edges:
+        if edge[2]["color"] == 0:
+            gate = prepare_singlet() if not cnot_circ else qkcirc.library.CXGate()
+            qc.append(gate, edge[:2])
+
+    # Add p cycles of parameterized gates.
+    par_count = 0
+    for _ in range(p):
+        for edge in sorted_edges:
+            par = Parameter("al_{}".format(par_count))
+            gate = heis_gate(par) if not cnot_circ else qkcirc.library.CXGate()
+            qc.append(gate, edge[:2])
+            par_count += 1
+
+    # Our routing technique, explained later, assumes circuits with a connected coupling graph. If p = 0, pad the circuit with identity gates to make the coupling graph connected.
+    if p == 0:
+        for edge in sorted_edges:
+            qc.append(pad_gate(), edge[:2])
+
+    return qc
@@ -4,24 +4,27 @@ Code to implement line-graph routing. For explaination of the code, see line_gra
 
 import networkx as nx
 from qiskit import QuantumCircuit
-from qiskit.circuit import Parameter
-from qiskit.converters import circuit_to_dag, dag_to_circuit
+from qiskit.converters import circuit_to_dag
 from collections import OrderedDict
-from matplotlib import pyplot as plt
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing as mp
+import os
+import hashlib
+import importlib
+import json
+import tracemalloc
 import numpy as np
-import random as rand
-import qiskit.circuit as qkcirc
-from qiskit.transpiler import TransformationPass, CouplingMap
-from qiskit.compiler import transpile
+from qiskit.circuit import CircuitInstruction, Gate, Parameter, ParameterExpression
+from qiskit.circuit.library import SwapGate, get_standard_gate_name_mapping
+from qiskit.transpiler import TransformationPass
 from qiskit.dagcircuit import dagnode
-from time import time
-from tabulate import tabulate
-from scipy.stats import bootstrap
+from time import perf_counter
+from contextlib import contextmanager, nullcontext
 
 
 class DoubleSwapRemover(TransformationPass):
     """
-    Transpiler pass to cancel double swap gates.
+    Transpiler pass to cancel double swap gates. See remove_double_swaps() for a linear-time equivalent that does not substitute DAG nodes.
     """
 
     def run(self, dag):
@@ -40,7 +43,8 @@ class DoubleSwapRemover(TransformationPass):
 class OuterSwapRemover(TransformationPass):
     """
     Transpiler pass to remove superflous swap gates at the beginning and end of the circuit.
-    Warning: no relabeling of the qubits is performed.
+    Warning: no relabeling of the qubits is performed. The permutation of the qubits that the removed swaps amount to is returned by swap_layout().
+    See remove_outer_swaps() for a linear-time equivalent that does not substitute DAG nodes.
     """
 
     def run(self, dag):
@@ -57,99 +61,866 @@ class OuterSwapRemover(TransformationPass):
         return dag
 
 
-def coupling_graph(qc: QuantumCircuit) -> nx.Graph:
+def circuit_gates(qc: QuantumCircuit):
+    """
+    Yield the gates of qc as (operation, qubits) pairs, with qubits a tuple of the int indices of the qubits the gate acts on.
+    """
+    index = {qubit: k for k, qubit in enumerate(qc.qubits)}
+    for inst in qc.data:
+        yield inst.operation, tuple(index[q] for q in inst.qubits)
+
+
+def gates_to_circuit(gates, num_qubits: int, used=None) -> QuantumCircuit:
+    """
+    Return a QuantumCircuit on num_qubits qubits consisting of `gates`, an iterable of (operation, qubits) pairs with qubits a tuple of ints. If the set `used` of qubits that are acted upon by `gates` is given, the idle qubits are left out, as in remove_idle_qwires().
+    """
+    qc = QuantumCircuit(num_qubits)
+    out = qc.qubits
+    if used is not None:
+        qc = QuantumCircuit()
+        qc.add_bits([out[q] for q in sorted(used)])
+    for operation, qubits in gates:
+        qc._append(CircuitInstruction(operation, tuple(out[q] for q in qubits)))
+    return qc
+
+
+def double_swaps(gates) -> set:
+    """
+    Return the positions of the swap gates that are cancelled by DoubleSwapRemover in `gates`, a sequence of (operation, qubits) pairs with qubits a tuple of ints. A swap is cancelled together with the swap directly following it on both its qubits, unless it was itself cancelled with the swap directly preceding it. Runs in a single pass over `gates`.
+    """
+    last = {}  # Position of the last gate on every qubit.
+    cancelled = set()
+    for k, (operation, qubits) in enumerate(gates):
+        if operation.name == "swap":
+            prev = last.get(qubits[0])
+            if (
+                prev is not None
+                and prev == last.get(qubits[1])
+                and gates[prev][0].name == "swap"
+                and prev not in cancelled
+            ):
+                cancelled.add(prev)
+                cancelled.add(k)
+        for q in qubits:
+            last[q] = k
+    return cancelled
+
+
+def outer_swaps(gates, skip=frozenset()) -> set:
+    """
+    Return the positions of the swap gates that are removed by OuterSwapRemover in `gates`, a sequence of (operation, qubits) pairs with qubits a tuple of ints. The positions in `skip` are treated as if they were not present. A swap is removed if no gates that are not removed precede it on both its qubits, or if no gates follow it on both its qubits. Runs in two passes over `gates`.
+    """
+    last = {}
+    for k, (operation, qubits) in enumerate(gates):
+        if k not in skip:
+            for q in qubits:
+                last[q] = k
+    touched = set()  # Qubits acted upon by gates that are not removed.
+    removed = set()
+    for k, (operation, qubits) in enumerate(gates):
+        if k in skip:
+            continue
+        if operation.name == "swap" and (
+            touched.isdisjoint(qubits) or all(last[q] == k for q in qubits)
+        ):
+            removed.add(k)
+        else:
+            touched.update(qubits)
+    return removed
+
+
+class RoutingLayout:
+    """
+    The layout of the qubits of a line-graph routed circuit, as returned by swap_layout() and line_graph_route(qc, return_layout=True). Qubit x of the input circuit (logical qubit x) starts on qubit initial[x] of the output circuit and ends on qubit final[x], with the swaps that were removed from the beginning and end of the routed circuit taken into account. Qubit k of the output circuit is qubit physical[k] of the heavy graph, so that physical is the map by which idle qubits were removed. All three are numpy int arrays. Logical qubits that are not in the output circuit are mapped to -1.
+    """
+
+    def __init__(self, initial, final, physical):
+        self.initial = initial
+        self.final = final
+        self.physical = physical
+
+    def __repr__(self):
+        return "RoutingLayout(initial={}, final={}, physical={})".format(
+            self.initial.tolist(), self.final.tolist(), self.physical.tolist()
+        )
+
+
+def swap_layout(
+    gates, double, outer, used, num_qubits: int, num_logical: int, inserted=None
+) -> RoutingLayout:
+    """
+    Return the RoutingLayout of the circuit that remains of `gates`, a sequence of (operation, qubits) pairs with qubits a tuple of ints < num_qubits, in which logical qubit x starts on qubit x, after removal of the swaps at the positions in `double` (as returned by double_swaps()) and `outer` (as returned by outer_swaps(gates, skip=double)), and of the idle qubits, which are those not in the set `used`.
+
+    Only the swaps at the positions in the set `inserted` (all swaps if inserted is None) were inserted by routing, and move logical qubits. The other swaps are gates of the input circuit, which exchange the states of two logical qubits but leave the qubits where they are. Cancelling double swaps does not change the circuit. A removed outer swap does, whether it was inserted or not, and is folded into the layout as a relabelling of the qubits: into the initial layout if no remaining gate precedes it on its qubits, and into the final layout otherwise. Runs in a single pass over `gates`, after which the layout is mapped to the qubits of the output circuit by indexing, instead of by tracking the wires of a DAG.
+    """
+    first = list(range(num_qubits))  # The logical qubit on every qubit at the start.
+    occupant = list(range(num_qubits))  # The logical qubit on every qubit.
+    trailing = []
+    touched = set()  # Qubits acted upon by remaining gates.
+    for k, (operation, qubits) in enumerate(gates):
+        if k in outer:
+            a, b = qubits
+            if touched.isdisjoint(qubits):
+                first[a], first[b] = first[b], first[a]
+            else:
+                trailing.append(qubits)
+        elif k not in double:
+            touched.update(qubits)
+        if operation.name == "swap" and (inserted is None or k in inserted):
+            a, b = qubits
+            occupant[a], occupant[b] = occupant[b], occupant[a]
+    # Trailing swaps act on disjoint qubits, with no remaining gates after them.
+    for a, b in trailing:
+        occupant[a], occupant[b] = occupant[b], occupant[a]
+
+    physical = np.array(sorted(used), dtype=int)
+    compact = np.full(num_qubits, -1, dtype=int)
+    compact[physical] = np.arange(len(physical))
+    m = min(num_logical, num_qubits)
+    layout = []
+    for nodes in (first, occupant):
+        position = np.empty(num_qubits, dtype=int)
+        position[nodes] = compact
+        out = np.full(num_logical, -1, dtype=int)
+        out[:m] = position[:m]
+        layout.append(out)
+    return RoutingLayout(*layout, physical)
+
+
+def remove_swaps(qc: QuantumCircuit, double: bool = True, outer: bool = True):
+    """
+    Return a copy of qc without the swaps that DoubleSwapRemover (if double==True) followed by OuterSwapRemover (if outer==True) would remove from qc. The output circuit is written once, without converting qc to a DAG.
+    """
+    gates = list(circuit_gates(qc))
+    removed = double_swaps(gates) if double else set()
+    if outer:
+        removed |= outer_swaps(gates, skip=removed)
+
+    cp = qc.copy_empty_like()
+    for k, inst in enumerate(qc.data):
+        if k not in removed:
+            cp._append(inst)
+    return cp
+
+
+def remove_double_swaps(qc: QuantumCircuit) -> QuantumCircuit:
+    """
+    Return a copy of qc with double swap gates cancelled. Linear-time equivalent of DoubleSwapRemover.
+    """
+    return remove_swaps(qc, double=True, outer=False)
+
+
+def remove_outer_swaps(qc: QuantumCircuit) -> QuantumCircuit:
+    """
+    Return a copy of qc with superflous swap gates at the beginning and end of the circuit removed. Linear-time equivalent of OuterSwapRemover. Warning: no relabeling of the qubits is performed; see swap_layout() for the permutation that the removed swaps amount to.
+    """
+    return remove_swaps(qc, double=False, outer=True)
+
+
+def coupling_graph(qc: QuantumCircuit, return_edges: bool = False) -> nx.Graph:
     """
     Return the coupling graph of a qiskit QuantumCircuit. All gate labels of qc must be ints. The lowest qubit label must be 0. Circuits must consist out of one- and two-qubit gates by assumption.
+
+    The qubit indices are looked up in a dict built once, and the edges are deduplicated in a dict before they are added to the graph, so that the nodes and edges are in the order in which the gates of qc first act on them. If return_edges==True, the edges are also returned, as a numpy array of shape (number of edges, 2).
     """
+    index = {qubit: k for k, qubit in enumerate(qc.qubits)}
+    nodes = {}
+    edges = {}
+    for inst in qc.data:
+        qubits = inst.qubits
+        if len(qubits) == 2:
+            i = index[qubits[0]]
+            j = index[qubits[1]]
+            nodes[i] = nodes[j] = None
+            edges.setdefault((i, j) if i < j else (j, i), (i, j))
+        elif len(qubits) == 1:
+            nodes[index[qubits[0]]] = None
+        else:
+            raise AssertionError(
+                "coupling_graph() is currently only implemented for circuits consisting out if one- and two-qubit gates."
+            )
+
+    assert min(nodes) == 0, "Lowest node int must be 0."
     cg = nx.Graph()
+    cg.add_nodes_from(nodes)
+    cg.add_edges_from(edges.values())
+    if return_edges:
+        return cg, np.array(list(edges.values()), dtype=int).reshape(-1, 2)
+    return cg
 
+
+def remove_idle_qwires(qc, return_qubits: bool = False):
+    # Return a QuantumCirucuit with idle qubits removed from qc. Does not resize the QuantumRegister of the qubits. Equivalent to removing the idle wires from the DAG of qc, but done by a single pass over qc, without copying its gates. If return_qubits==True, also return the sorted list of the indices in qc of the qubits that were kept.
+    index = {qubit: k for k, qubit in enumerate(qc.qubits)}
+    used = set()
     for inst in qc.data:
-        qubits = inst.qubits
+        used.update(index[q] for q in inst.qubits)
+
+    cp = QuantumCircuit(
+        *qc.cregs, name=qc.name, global_phase=qc.global_phase, metadata=qc.metadata
+    )
+    cp.add_bits([qc.qubits[k] for k in sorted(used)])
+    for inst in qc.data:
+        cp._append(inst)
+
+    if return_qubits:
+        return cp, sorted(used)
+    return cp
+
+
+def heavy(g: nx.Graph) -> nx.Graph:
+    """
+    Return the heavy variant h of the networkx.Graph g, assuming g is of the form as returned by Roussopoulos' algorithm (nx.inverse_line_graph). The newly added 'heavy' nodes have labels equal to the graph that was put in to Roussopoulos' algorithm. This is algorithm 1 in the paper.
+    """
+    h = nx.Graph()
+    for a, b in g.edges():
+        cn = tuple(set(a) & set(b))  # common node
+        assert len(cn) == 1
+        if len(a) == 1 and len(b) != 1:
+            b = str(b)
+            h.add_edge(a[0], b)
+        elif len(a) != 1 and len(b) == 1:
+            a = str(a)
+            h.add_edge(a, b[0])
+        if len(a) != 1 and len(b) != 1:
+            a = str(a)
+            b = str(b)
+            h.add_edge(a, cn[0])
+            h.add_edge(cn[0], b)
+
+    return h
+
+
+def nodes_to_ints(h: nx.Graph) -> nx.Graph:
+    """
+    Return h with all non-int nodes mapped to ints. Int nodes remain unchanged.
+    """
+    ints = [i for i in h.nodes if type(i) == int]
+    maxint = max(ints)
+    mapping = {}
+    i = 1
+    for node in h.nodes():
+        if type(node) != int:
+            mapping[node] = maxint + i
+            i += 1
+    h = nx.relabel_nodes(h, mapping)
+    return h
+
+
+def lone_leaves(h: nx.Graph, num_qubits: int):
+    """
+    Return the lone leaves of the networkx.Graph h, whose nodes must be ints smaller than num_qubits, as a pair of numpy arrays (is_lone, leaf_nbr) of length num_qubits. Here is_lone[node] is True if `node` has degree one and its neighbour is not connected to any other node of degree one (a lone leaf, which 'augmented line-graph routing' removes to reduce the number of qubits), and leaf_nbr[node] is the single neighbour of a lone leaf `node`, and -1 for all other nodes. Computed in a single pass over the nodes of h, so that the lone leaf test of any node takes O(1) time afterwards.
+    """
+    degree = np.zeros(num_qubits, dtype=int)
+    leaf_nbr = np.full(num_qubits, -1)
+    for node, d in h.degree:
+        degree[node] = d
+    for node in h.nodes:
+        if degree[node] == 1:
+            leaf_nbr[node] = next(iter(h[node]))
+    # Number of leaves attached to every node.
+    is_leaf = leaf_nbr >= 0
+    num_leaves = np.bincount(leaf_nbr[is_leaf], minlength=num_qubits)
+    is_lone = np.zeros(num_qubits, dtype=bool)
+    is_lone[is_leaf] = num_leaves[leaf_nbr[is_leaf]] == 1
+    leaf_nbr[~is_lone] = -1
+    return is_lone, leaf_nbr
+
+
+def line_graph_cells(cg: nx.Graph) -> list:
+    """
+    Return the partition of the nodes of the line graph cg into cells, as a list of tuples. Every cell is a clique of cg, formed by the edges at one node of the root graph g = nx.inverse_line_graph(cg). The cells and their order are those found by Roussopoulos' algorithm as implemented in nx.inverse_line_graph(), but the graph is only accessed through a dict of neighbour dicts, from which the edges of every cell are removed. Raises nx.NetworkXError if cg is not a line graph.
+    """
+    # The starting cell is found in cg itself, and the other cells in a copy of the neighbour dicts of cg, built as by cg.copy(), which determines the order of the nodes in every cell.
+    nbrs = cg.adj
+    adj = {u: {} for u in nbrs}
+    for u, vs in nbrs.items():
+        for v in vs:
+            adj[u][v] = adj[v][u] = None
+
+    def triangles(u, v):
+        return [(u, v, x) for x in nbrs[u] if x in nbrs[v]]
+
+    def odd(triangle):
+        count = {}
+        for t in triangle:
+            for v in nbrs[t]:
+                if v not in triangle:
+                    count[v] = count.get(v, 0) + 1
+        return any(c == 1 or c == 3 for c in count.values())
+
+    def starting_cell(e):
+        e_triangles = triangles(*e)
+        r = len(e_triangles)
+        if r == 0:
+            return e
+        if r == 1:
+            a, b, c = e_triangles[0]
+            if len(triangles(a, c)) != 1:
+                return starting_cell((a, c))
+            if len(triangles(b, c)) != 1:
+                return starting_cell((b, c))
+            return e_triangles[0]
+        odd_triangles = [t for t in e_triangles if odd(t)]
+        s = len(odd_triangles)
+        if r == 2 and s == 0:
+            return e_triangles[-1]
+        if not r - 1 <= s <= r:
+            raise nx.NetworkXError(
+                "G is not a line graph (incorrect number of odd triangles around starting edge)"
+            )
+        nodes = set()
+        for t in odd_triangles:
+            nodes.update(t)
+        if any(v not in nbrs[u] for u in nodes for v in nodes if u != v):
+            raise nx.NetworkXError(
+                "G is not a line graph (odd triangles do not form complete subgraph)"
+            )
+        return tuple(nodes)
+
+    def remove_clique(cell):
+        for k, u in enumerate(cell):
+            for v in cell[k + 1 :]:
+                del adj[u][v], adj[v][u]
+
+    num_edges = cg.number_of_edges()
+    u = next(u for u in nbrs if nbrs[u])
+    cell = tuple(starting_cell((u, next(iter(nbrs[u])))))
+    cells = [cell]
+    remove_clique(cell)
+    num_edges -= len(cell) * (len(cell) - 1) // 2
+    stack = list(cell)
+    while num_edges > 0:
+        u = stack.pop()
+        if adj[u]:
+            cell = (u, *adj[u])
+            if any(v not in adj[w] for w in cell for v in cell if v != w):
+                raise nx.NetworkXError(
+                    "G is not a line graph (partition cell not a complete subgraph)"
+                )
+            cells.append(cell)
+            remove_clique(cell)
+            num_edges -= len(cell) * (len(cell) - 1) // 2
+            stack += cell
+    return cells
+
+
+def heavy_graph(cg: nx.Graph, cells=None):
+    """
+    Return the pair (h, middle), with h the heavy graph of the root graph of the line graph cg, with all nodes ints, and `middle` a dict that maps every edge (i, j) of cg, in both orientations, to the middle node between i and j in h.
+
+    The root graph is given by `cells`, a partition of the nodes of cg into cliques as returned by line_graph_cells(), which is computed if cells is None. Every cell becomes a node of h, which is connected to the nodes of cg in the cell. The new nodes get the labels max(cg.nodes) + 1, ... in the order in which they first occur. In the case of cells=None, h equals nodes_to_ints(heavy(nx.inverse_line_graph(cg))), including the order of its nodes and edges, but it is computed in time linear in the size of cg, without building g with tuple labels or h with string labels.
+    """
+    if cg.number_of_nodes() == 1:
+        h = nodes_to_ints(heavy(nx.inverse_line_graph(cg)))
+        return h, {}
+    if cells is None:
+        cells = line_graph_cells(cg)
+    elif any(
+        v not in cg.adj[u] for cell in cells for u in cell for v in cell if u != v
+    ):
+        raise ValueError("Every cell must be a clique of cg.")
+    # The cells (and the nodes in one cell only, which are nodes of degree one of the root graph) that contain every node of cg.
+    where = {u: [] for u in cg.nodes}
+    for k, cell in enumerate(cells):
+        for u in cell:
+            where[u].append(k)
+    if max(len(ks) for ks in where.values()) > 2:
+        raise nx.NetworkXError(
+            "G is not a line graph (vertex found in more than two partition cells)"
+        )
+
+    # The edges of the root graph (a, b) with common node u, in the order of nx.inverse_line_graph(cg).edges. Nodes of degree one of the root graph come last and are left out of h.
+    singles = len(cells)
+    roots = []
+    for u, ks in where.items():
+        if len(ks) == 1:
+            roots.append((ks[0], singles, u))
+            singles += 1
+        else:
+            roots.append((ks[0], ks[1], u))
+    roots.sort()
+    first = max(cg.nodes) + 1
+    label = {}
+    h = nx.Graph()
+    for a, b, u in roots:
+        if a not in label:
+            label[a] = first + len(label)
+        if b < len(cells):
+            if b not in label:
+                label[b] = first + len(label)
+            h.add_edge(label[a], u)
+            h.add_edge(u, label[b])
+        else:
+            h.add_edge(label[a], u)
+    # Rebuild h as relabeling it from strings to ints does, which changes the order of the neighbours of its nodes.
+    relabeled = nx.Graph()
+    relabeled.add_nodes_from(h)
+    relabeled.add_edges_from(h.edges)
+    h = relabeled
+
+    middle = {}
+    for i, j in cg.edges:
+        common = [k for k in where[i] if k in where[j]]
         assert (
-            len(qubits) == 1 or len(qubits) == 2
-        ), "coupling_graph() is currently only implemented for circuits consisting out if one- and two-qubit gates."
+            len(common) == 1
+        ), "The path through h=heavy(g) from node i to j of g must touch 3 nodes."
+        middle[(i, j)] = middle[(j, i)] = label[common[0]]
+    return h, middle
+
+
+def coupling_graph_key(cg: nx.Graph) -> str:
+    """
+    Return a hash of the coupling graph cg. Graphs with the same nodes and edges have the same key only if their nodes, and the neighbours of every node, are in the same order, because the labels of the middle nodes of heavy_graph(cg) depend on the order in which the cells of cg are found, which follows these orders. A plan cached under this key thus routes every circuit with that key as a freshly built plan would.
+    """
+    adjacency = [(u, list(cg.adj[u])) for u in cg.nodes]
+    return hashlib.sha1(repr(adjacency).encode()).hexdigest()
+
+
+class RoutingStats:
+    """
+    Opt-in instrumentation of line_graph_route(). Pass an instance as `stats` to line_graph_route() (or routing_plan()) to collect the wall-clock time of every stage, measured with time.perf_counter, in the dict `times`, and counters such as the number of swaps inserted and cancelled, in the dict `counts`. The stages are "coupling graph", "inverse line graph", "heavy graph", "routing plan", "resize register", "reroute", "lone-leaf removal", "label fixing", "double-swap removal", "outer-swap removal" and "idle-wire removal". Stages that are skipped, such as the plan stages for a cached plan, are left out. The fused engine reroutes, removes lone leaves and fixes labels in a single pass, which is timed as "reroute"; its "swaps inserted" and "lone-leaf swaps removed" still count the swaps next to lone leaves that it never inserts, as the staged path does, so that both report the same counts. Every routing counts the "gates in", and the "gates out", "swaps out" and "qubits dropped" of the output circuit. Periodic routing is timed as a whole, as "periodic route", after the "coupling graph" and plan stages if no plan is passed. Since it only routes a few cycles and tiles them, it does not record "swaps inserted" or the counts of the swaps removed by every pass.
+
+    Times and counts accumulate over routings, so that a single instance can monitor many calls. The number of routings is counted as "routings". If `callback` is given, it is called with the stats after every routing.
+
+    If memory==True and tracemalloc is tracing, the peak memory allocated in every stage (on top of the memory in use when the stage starts) is recorded in bytes in the dict `peaks`, keeping the maximum over routings. This resets the tracemalloc peak at the start of every stage; the peak before that reset is kept in `peak`, so that max(self.peak, tracemalloc.get_traced_memory()[1]) is the peak over all stages.
+    """
+
+    def __init__(self, callback=None, memory: bool = False):
+        self.times = {}
+        self.counts = {}
+        self.callback = callback
+        self.memory = memory
+        self.peaks = {}
+        self.peak = 0
+
+    @contextmanager
+    def timer(self, stage: str):
+        """
+        Context manager that adds the time spent in its body to self.times[stage], and records its peak memory if self.memory is True.
+        """
+        traced = self.memory and tracemalloc.is_tracing()
+        if traced:
+            current, peak = tracemalloc.get_traced_memory()
+            self.peak = max(self.peak, peak)
+            tracemalloc.reset_peak()
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.times[stage] = self.times.get(stage, 0.0) + perf_counter() - start
+            if traced:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak = max(self.peak, peak)
+                self.peaks[stage] = max(self.peaks.get(stage, 0), peak - current)
+
+    def count(self, name: str, n: int = 1):
+        """
+        Add n to the counter self.counts[name].
+        """
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def finish(self):
+        """
+        Count a finished routing and call the callback, if any.
+        """
+        self.count("routings")
+        if self.callback is not None:
+            self.callback(self)
+
+    def total(self) -> float:
+        """
+        Return the total time of all stages.
+        """
+        return sum(self.times.values())
+
+    def __repr__(self):
+        times = ", ".join("{}: {:.6f}".format(k, v) for k, v in self.times.items())
+        counts = ", ".join("{}: {}".format(k, v) for k, v in self.counts.items())
+        return "RoutingStats(times={{{}}}, counts={{{}}})".format(times, counts)
+
+
+def stage_timer(stats):
+    """
+    Return stats.timer, or a function returning a context manager that does nothing if stats is None.
+    """
+    if stats is None:
+        return lambda stage: nullcontext()
+    return stats.timer
+
+
+class RoutingPlan:
+    """
+    Precompiled line-graph routing of a coupling graph cg. Builds the heavy graph `h` of the inverse line graph of cg once, with all nodes mapped to ints, by heavy_graph(). If the root graph of cg is known, such as for the lattices of lattice_cells(), its cells can be passed as `cells`, which skips the computation of the inverse line graph. The table `route` maps every edge (i, j) of cg, in both orientations, to (m, s), with m the middle node between i and j in h and s the qubit that is swapped into m. The qubit with the lowest degree in h is always swapped in.
+
+    The lone leaves of h are stored in the arrays `is_lone` and `leaf_nbr`, as returned by lone_leaves(). For the fused engine (fused_reroute), the plan also holds the list `relabel` that implements the label fixing of augmented line-graph routing (every neighbour of a lone leaf takes over the label of that leaf), and the table `fused`. This table maps every edge (i, j) of cg to (swap, gate, unswap), with `swap` and `unswap` the relabeled qubits of the swaps before and after the gate, or None if these swaps hit a lone leaf, and `gate` the relabeled qubits of the gate itself. Use routing_plan() to obtain cached plans; a cached plan is reused for any coupling graph with the same nodes and edges.
+    """
+
+    def __init__(self, cg: nx.Graph, cells=None, stats: RoutingStats = None):
+        assert nx.is_connected(
+            cg
+        ), "Line-graph routing only implemented for connected connectivity graphs. Route the disconnected circuits seperately or add padding identity gates with pad_gate()"
+        timer = stage_timer(stats)
+        if stats is not None and cells is None and cg.number_of_nodes() > 1:
+            with timer("inverse line graph"):
+                cells = line_graph_cells(cg)
+        with timer("heavy graph"):
+            h, middle = heavy_graph(cg, cells)
+        assert nx.is_connected(h)
+        with timer("routing plan"):
+            self.build(cg, h, middle)
+
+    def build(self, cg: nx.Graph, h: nx.Graph, middle: dict):
+        """
+        Build the tables of the plan from the heavy graph h and the middle nodes `middle`, as returned by heavy_graph(cg).
+        """
+
+        self.key = coupling_graph_key(cg)
+        self.h = h
+        self.num_qubits = max(h.nodes) + 1
+        self.route = {}
+        for i, j in cg.edges:
+            m = middle[(i, j)]
+            self.route[(i, j)] = (m, j if h.degree[i] >= h.degree[j] else i)
+            self.route[(j, i)] = (m, i if h.degree[j] >= h.degree[i] else j)
+
+        self.is_lone, self.leaf_nbr = lone_leaves(h, self.num_qubits)
+        relabel = np.arange(self.num_qubits)
+        relabel[self.leaf_nbr[self.is_lone]] = np.flatnonzero(self.is_lone)
+        self.relabel = relabel.tolist()
+        is_lone = self.is_lone.tolist()
+        self.fused = {}
+        for (i, j), (m, s) in self.route.items():
+            if is_lone[s] or is_lone[m]:
+                swap = unswap = None
+            else:
+                swap = (self.relabel[s], self.relabel[m])
+                unswap = (self.relabel[m], self.relabel[s])
+            if s == j:
+                gate = (self.relabel[i], self.relabel[m])
+            else:
+                gate = (self.relabel[m], self.relabel[j])
+            assert not (
+                is_lone[m] or is_lone[i + j - s]
+            ), "In the rerouted circuit (pre removal of degree 1 nodes) any two-qubit gate hitting a lone leaf node must be a SWAP gate."
+            self.fused[(i, j)] = (swap, gate, unswap)
+
+        # The table `fused` as arrays, for reroute_arrays(). Row k of edge_table holds the qubits of the swap, gate and unswap of the edge with key edge_keys[k] = i * num_qubits + j, with -1 for absent swaps.
+        rows = sorted(
+            (i * self.num_qubits + j, *(swap or (-1, -1)), *gate, *(unswap or (-1, -1)))
+            for (i, j), (swap, gate, unswap) in self.fused.items()
+        )
+        table = np.array(rows, dtype=np.int64).reshape(-1, 7)
+        self.edge_keys = table[:, 0]
+        self.edge_table = table[:, 1:]
+
+
+plan_cache_size = 64
+plan_cache = OrderedDict()
+
+
+def routing_plan(cg: nx.Graph, cells=None, stats: RoutingStats = None) -> RoutingPlan:
+    """
+    Return the RoutingPlan of the coupling graph cg, built from the root graph given by `cells` if these are passed. Plans are kept in the least-recently-used cache `plan_cache`, keyed by coupling_graph_key(cg) (and the cells, if given), which holds at most `plan_cache_size` plans. If RoutingStats are passed as `stats`, cache hits and misses are counted, and the stages of building a plan are timed.
+    """
+    key = coupling_graph_key(cg)
+    if cells is not None:
+        key = (key, hashlib.sha1(repr(cells).encode()).hexdigest())
+    if key in plan_cache:
+        plan_cache.move_to_end(key)
+        if stats is not None:
+            stats.count("plan cache hits")
+        return plan_cache[key]
+    if stats is not None:
+        stats.count("plan cache misses")
+    plan = RoutingPlan(cg, cells, stats)
+    plan_cache[key] = plan
+    while len(plan_cache) > plan_cache_size:
+        plan_cache.popitem(last=False)
+    return plan
+
+
+swap_gate = SwapGate()
+
+
+def reroute_gates(gates, plan: RoutingPlan):
+    """
+    Yield the line-graph rerouted gates of `gates`, an iterable of (operation, qubits) pairs with qubits a tuple of ints, according to the RoutingPlan plan. Lone leaf qubits are removed and labels are fixed, but superflous SWAPs are not removed. Yields (operation, qubits) pairs. The swaps inserted by routing have the operation swap_gate, so that they can be told apart from the swaps in `gates` (see swap_layout()).
+    """
+    relabel = plan.relabel
+    fused = plan.fused
+    for operation, qubits in gates:
         if len(qubits) == 1:
-            q = qc.find_bit(qubits[0]).index
-            assert type(q) == int
-            cg.add_node(q)
+            yield operation, (relabel[qubits[0]],)
         elif len(qubits) == 2:
-            q0 = qc.find_bit(qubits[0]).index
-            q1 = qc.find_bit(qubits[1]).index
-            assert type(q0) == int and type(q1) == int
-            cg.add_edge(q0, q1)
+            if operation.name == "pad":
+                continue
+            swap, gate, unswap = fused[qubits]
+            if swap is not None:
+                yield swap_gate, swap
+            yield operation, gate
+            if unswap is not None:
+                yield swap_gate, unswap
+        else:
+            raise ValueError(
+                "line_graph_route() is currently only for circuits consisting out if one- and two-qubit gates."
+            )
 
-    assert sorted(cg.nodes)[0] == 0, "Lowest node int must be 0."
-    return cg
 
+def fused_reroute(qc: QuantumCircuit, plan: RoutingPlan) -> QuantumCircuit:
+    """
+    Line-graph reroute qc according to the RoutingPlan plan, including removal of lone leaf qubits and fixing of labels, but without removal of superflous SWAPs. Equivalent to applying the stages resize_register_to, bare_reroute, remove_lone_leaf and fix_labels of line_graph_route() in sequence, but in a single pass over qc that writes the output circuit once.
+    """
+    return gates_to_circuit(reroute_gates(circuit_gates(qc), plan), plan.num_qubits)
 
-def remove_idle_qwires(qc):
-    # Return a QuantumCirucuit with idle qubits removed from qc. Does not resize the QuantumRegister of the qubits.
-    dag = circuit_to_dag(qc)
-    idle_wires = list(dag.idle_wires())
-    for w in idle_wires:
-        dag._remove_idle_wire(w)
-        dag.qubits.remove(w)
 
-    dag.qregs = OrderedDict()
+def edge_colors(colors) -> dict:
+    """
+    Return the edge colors `colors`, a networkx.Graph with 'color' edge attributes (such as the graphs passed to heis_circuit()) or a dict that maps edges (i, j) to colors, as a dict that maps every edge in both orientations to its color.
+    """
+    if isinstance(colors, nx.Graph):
+        colors = nx.get_edge_attributes(colors, "color")
+    color = {}
+    for (i, j), c in colors.items():
+        color[(i, j)] = color[(j, i)] = c
+    return color
 
-    return dag_to_circuit(dag)
 
+def gate_layers(gates, colors=None) -> list:
+    """
+    Partition `gates`, a sequence of (operation, qubits) pairs with qubits a tuple of ints, into layers of gates on disjoint qubits by greedy ASAP layering: every gate is put in the first layer after the last layer that holds a gate on one of its qubits. Return the layers as lists of (operation, qubits) pairs.
 
-def line_graph_route(qc: QuantumCircuit) -> QuantumCircuit:
+    If edge colors are passed as `colors` (see edge_colors()), every run of consecutive two-qubit gates with the same color starts a new layer, so that every color class of a circuit such as heis_circuit() forms a layer of its own. One-qubit gates and gates on edges without a color do not start a new layer.
+    """
+    color = edge_colors(colors) if colors is not None else {}
+    ready = {}  # The first layer in which every qubit is free.
+    barrier = 0  # The first layer of the current color class.
+    current = None
+    layers = []
+    for operation, qubits in gates:
+        c = color.get(qubits) if len(qubits) == 2 else None
+        if c is not None and c != current:
+            barrier = len(layers)
+            current = c
+        level = max([barrier] + [ready.get(q, 0) for q in qubits])
+        if level == len(layers):
+            layers.append([])
+        layers[level].append((operation, qubits))
+        for q in qubits:
+            ready[q] = level + 1
+    return layers
+
+
+def layered_reroute(gates, plan: RoutingPlan, colors=None):
     """
-    Reroute the gates of qiskit.Quantum circuit c by line-graph rerouting. Return the rerouted circtuit cp.
+    Yield the line-graph rerouted gates of `gates` like reroute_gates(), but scheduled in parallel layers to reduce the depth of the routed circuit. The gates are first partitioned by gate_layers(), which uses the edge colors `colors` if given, and greedy ASAP layering otherwise. The gates of a layer act on disjoint qubits, so that their routed swap, gate and unswap commute. Two of them may still share a node of the heavy graph, which is the middle node of the cell of both edges. Every layer is therefore split, by first fit, into sublayers of gates that share no heavy nodes, and every sublayer is emitted as all its swaps, then all its gates, then all its unswaps. Yields (operation, qubits) pairs, with the inserted swaps marked as by reroute_gates().
     """
+    relabel = plan.relabel
+    fused = plan.fused
+    layers = gate_layers(gates, colors)
+    # The number of layers from every gate to the end of the circuit, along the qubits of the gate, computed backwards. Within a layer, gates with the largest height are scheduled first.
+    tail = {}
+    for k in reversed(range(len(layers))):
+        heights = [1 + max(tail.get(q, 0) for q in qubits) for _, qubits in layers[k]]
+        for (operation, qubits), height in zip(layers[k], heights):
+            for q in qubits:
+                tail[q] = height
+        order = sorted(range(len(heights)), key=lambda n: -heights[n])
+        layers[k] = [layers[k][n] for n in order]
+    for layer in layers:
+        sublayers = []  # Pairs (heavy nodes, gates) of every sublayer.
+        for operation, qubits in layer:
+            if len(qubits) == 1:
+                routed = (None, (operation, (relabel[qubits[0]],)), None)
+            elif len(qubits) == 2:
+                if operation.name == "pad":
+                    continue
+                swap, gate, unswap = fused[qubits]
+                routed = (swap, (operation, gate), unswap)
+            else:
+                raise ValueError(
+                    "line_graph_route() is currently only for circuits consisting out if one- and two-qubit gates."
+                )
+            nodes = set(routed[1][1])
+            if routed[0] is not None:
+                nodes.update(routed[0])
+            for used, members in sublayers:
+                if used.isdisjoint(nodes):
+                    used.update(nodes)
+                    members.append(routed)
+                    break
+            else:
+                sublayers.append((nodes, [routed]))
+        for used, members in sublayers:
+            for swap, gate, unswap in members:
+                if swap is not None:
+                    yield swap_gate, swap
+            for swap, gate, unswap in members:
+                yield gate
+            for swap, gate, unswap in members:
+                if unswap is not None:
+                    yield swap_gate, unswap
+
+
+def lazy_reroute(gates, plan: RoutingPlan, restore: bool = False):
+    """
+    Yield the line-graph rerouted gates of `gates`, an iterable of (operation, qubits) pairs with qubits a tuple of ints, according to the RoutingPlan plan, without swapping qubits back after every gate. Yields (operation, qubits) pairs, with the qubits labeled and the inserted swaps marked as by reroute_gates().
+
+    The position of every qubit on the heavy graph is tracked. A qubit that is swapped into the middle node of a cell stays there, so that later gates in that cell can use it without further swaps. A qubit is only swapped back to its own node when the middle node is needed by another qubit of the cell, or when the qubit takes part in a gate in its other cell. If restore==True, all qubits are swapped back to their own nodes at the end. Otherwise they are left where they are, which permutes the qubits of the output relative to reroute_gates(); the swaps that would restore them are exactly the trailing swaps that line_graph_route() removes anyway.
+    """
+    relabel = plan.relabel
+    route = plan.route
+    leaf_nbr = plan.leaf_nbr.tolist()
+    pos = {}  # The middle node of every qubit that has left its own node.
+    occupant = {}  # The qubit on every occupied middle node.
+    # A lone leaf qubit lives on the middle node of its only cell. A qubit that is swapped into that middle node swaps places with it, until it is swapped back.
+    pinned = {int(q): leaf_nbr[q] for q in np.flatnonzero(plan.is_lone)}
+
+    def where(x):
+        # The node of qubit x.
+        if x in pinned:
+            return occupant.get(pinned[x], pinned[x])
+        return pos.get(x, x)
+
+    def home(x):
+        # Swap qubit x from its middle node back to its own node.
+        m = pos.pop(x)
+        del occupant[m]
+        return swap_gate, (relabel[m], relabel[x])
+
+    for operation, qubits in gates:
+        if len(qubits) == 1:
+            yield operation, (relabel[where(qubits[0])],)
+        elif len(qubits) == 2:
+            if operation.name == "pad":
+                continue
+            i, j = qubits
+            m, s = route[qubits]
+            if j in pinned or pos.get(j) == m:
+                s = j
+            elif i in pinned or pos.get(i) == m:
+                s = i
+            t = i + j - s
+            if s in pinned and occupant.get(m) == t:
+                # Qubit t is on the middle node, and s on the node of t.
+                pass
+            else:
+                if t in pos:
+                    yield home(t)
+                if s in pinned:
+                    if m in occupant:
+                        yield home(occupant[m])
+                elif pos.get(s) != m:
+                    if s in pos:
+                        yield home(s)
+                    if m in occupant:
+                        yield home(occupant[m])
+                    pos[s] = m
+                    occupant[m] = s
+                    yield swap_gate, (relabel[s], relabel[m])
+            yield operation, (relabel[where(i)], relabel[where(j)])
+        else:
+            raise ValueError(
+                "line_graph_route() is currently only for circuits consisting out if one- and two-qubit gates."
+            )
+    if restore:
+        for x in list(pos):
+            yield home(x)
 
-    def heavy(g):
-        # Return the heavy variant h of the networkx.Graph g, assuming g is of the form as returned by Roussopouloss algorithm (nx.inverse_line_graph). The newly added 'heavy' nodes have labels equal to the graph that was put in to Roussopoulos' algorithm. This is algorithm 1 in the paper.
-        h = nx.Graph()
-        for a, b in g.edges():
-            cn = tuple(set(a) & set(b))  # common node
-            assert len(cn) == 1
-            if len(a) == 1 and len(b) != 1:
-                b = str(b)
-                h.add_edge(a[0], b)
-            elif len(a) != 1 and len(b) == 1:
-                a = str(a)
-                h.add_edge(a, b[0])
-            if len(a) != 1 and len(b) != 1:
-                a = str(a)
-                b = str(b)
-                h.add_edge(a, cn[0])
-                h.add_edge(cn[0], b)
 
-        return h
+def periodic_route(
+    qc: QuantumCircuit, period: int, plan: RoutingPlan = None
+) -> QuantumCircuit:
+    """
+    Line-graph route qc, assuming qc consists of a head of fewer than `period` gates followed by p cycles of `period` gates, where all cycles act with the same gates on the same qubits (up to the values of their parameters). This is the case for heis_circuit(g, p), with period=g.number_of_edges().
 
-    def lone_leaf(g, node):
-        # Return true if `node` is a node of degree one in networkx.graph `g` and the neighbor of `node` is not connected to any other nodes of degree one. This function is needed for 'augmented line-graph routing' which reduces the number qubits.
-        assert g.has_node(node)
-        if g.degree[node] != 1:
-            return False
+    Only the head and the first four cycles are routed and cleared of superflous swaps. The routed second cycle then serves as a template for all inner cycles, which is tiled p-2 times using the gates (with their own parameters) of the corresponding cycles of qc. The routing cost is thereby independent of p. The output equals that of line_graph_route(qc). Falls back to line_graph_route(qc) if p <= 4, or if the routed second and third cycle differ. If no RoutingPlan is passed, it is obtained from routing_plan().
+    """
+    gates = list(circuit_gates(qc))
+    head = len(gates) % period
+    p = len(gates) // period
+    cycle = [
+        (operation.name, qubits) for operation, qubits in gates[head : head + period]
+    ]
+    for c in range(1, p):
+        offset = head + c * period
+        assert all(
+            operation.name == name and qubits == cycle_qubits
+            for (operation, qubits), (name, cycle_qubits) in zip(
+                gates[offset : offset + period], cycle
+            )
+        ), "All cycles of a periodic circuit must act with the same gates on the same qubits."
+    if p <= 4:
+        return line_graph_route(qc, plan=plan)
+
+    if plan is None:
+        sample = qc.copy_empty_like()
+        for inst in qc.data[: head + 4 * period]:
+            sample._append(inst)
+        plan = routing_plan(coupling_graph(sample))
+
+    # Route the sample gate by gate, recording the input gate (source) every routed gate stems from.
+    routed = []
+    source = []
+    for k in range(head + 4 * period):
+        for gate in reroute_gates(gates[k : k + 1], plan):
+            routed.append(gate)
+            source.append(k)
+    removed = double_swaps(routed)
+    removed |= outer_swaps(routed, skip=removed)
+
+    # Split the remaining gates into blocks by the cycle they stem from. Block 0 also contains the head. Gates that are taken from the input circuit (instead of being inserted swaps) are stored with operation None, and their source relative to the start of the block, so that they can be filled in for any cycle.
+    starts = [0] + [head + c * period for c in range(1, 4)]
+    blocks = [[] for _ in range(4)]
+    for t, (operation, qubits) in enumerate(routed):
+        if t in removed:
+            continue
+        k = source[t]
+        b = 0 if k < starts[1] else (k - head) // period
+        if operation is gates[k][0]:
+            blocks[b].append((None, qubits, k - starts[b]))
         else:
-            # The single neighbour of `node`.
-            nbr = list(nx.neighbors(g, node))[0]
-            # Siblings of `node`. Contains `node` itself.
-            sibs = list(nx.neighbors(g, nbr))
-            # list of siblings with degree one
-            lone_sibs = [sib for sib in sibs if g.degree[sib] == 1]
-            assert len(lone_sibs) >= 1
-            if len(lone_sibs) == 1:
-                return True
-            else:
-                return False
-
-    def nodes_to_ints(h):
-        # Return h with all non-int nodes mapped to ints. Int nodes remain unchanged.
-        ints = [i for i in h.nodes if type(i) == int]
-        maxint = max(ints)
-        mapping = {}
-        i = 1
-        for node in h.nodes():
-            if type(node) != int:
-                mapping[node] = maxint + i
-                i += 1
-        h = nx.relabel_nodes(h, mapping)
-        return h
+            blocks[b].append((operation, qubits, k - starts[b]))
+    if blocks[1] != blocks[2]:
+        return line_graph_route(qc, plan=plan)
+
+    def tile():
+        for b, offset in [(0, 0)] + [(1, head + c * period) for c in range(1, p - 1)]:
+            for operation, qubits, k in blocks[b]:
+                yield operation or gates[offset + k][0], qubits
+        for operation, qubits, k in blocks[3]:
+            yield operation or gates[head + (p - 1) * period + k][0], qubits
+
+    used = {q for block in blocks for operation, qubits, k in block for q in qubits}
+    return gates_to_circuit(tile(), plan.num_qubits, used)
+
+
+def line_graph_route(
+    qc: QuantumCircuit,
+    fused: bool = True,
+    period: int = None,
+    plan: RoutingPlan = None,
+    layered: bool = False,
+    colors=None,
+    lazy: bool = False,
+    stats: RoutingStats = None,
+    return_layout: bool = False,
+) -> QuantumCircuit:
+    """
+    Reroute the gates of qiskit.Quantum circuit c by line-graph rerouting. Return the rerouted circtuit cp. The heavy graph is obtained from routing_plan(), so that routing many circuits with the same coupling graph only builds it once. Alternatively, the RoutingPlan of the coupling graph of qc can be passed as `plan`.
+
+    If fused==True, the rerouting, removal of lone leaf qubits and fixing of labels are done in a single pass by reroute_gates(), and the output circuit is written once, after removal of superflous swaps. Otherwise, these stages are applied one after the other, each producing an intermediate circuit.
+
+    If qc is periodic, such as the circuits returned by heis_circuit(), pass the number of gates per cycle as `period` to route only a few cycles and tile the result (see periodic_route()).
+
+    If layered==True, the routed gates are scheduled in parallel layers by layered_reroute(), which reduces the depth of the output circuit. The layers follow the edge colors `colors` if given (for heis_circuit(g, p), pass g), and greedy ASAP layering otherwise. Implies fused==True, and period is ignored.
+
+    If lazy==True, qubits are not swapped back after every gate, but left on the middle nodes of the heavy graph while later gates can use them there, by lazy_reroute(). This saves swaps, but the qubits of the output end up permuted. Implies fused==True, and period and layered are ignored.
+
+    Pass RoutingStats as `stats` to record the time of every stage and counters of the swaps inserted, the swaps cancelled by every pass and the qubits dropped. Collecting these adds a small overhead, and none if stats is None.
+
+    If return_layout==True, the RoutingLayout of the output circuit is returned as well, with the initial and final position of every qubit of qc on the qubits of the output circuit (see swap_layout()). This accounts for the swaps removed from the beginning and end of the circuit, for the permutation left by lazy routing, and for the removal of idle qubits, so that the output can be compared to qc without recovering the mapping by an equivalence check. Then period is ignored.
+    """
 
     def resize_register_to(qc, h):
         # Resize the quantum register of QuantumCircuit qc to the size of the number of nodes of h. All nodes of h must be ints.
@@ -159,9 +930,9 @@ def line_graph_route(qc: QuantumCircuit) -> QuantumCircuit:
             qcp.append(qcinst.replace(qubits=qubits))
         return qcp
 
-    def bare_reroute(qc, h):
+    def bare_reroute(qc, plan):
         # Line-graph reroute without removal of lone leaf qubits. And without removal of superflous SWAPs. Map circuit on cg, the coupling graph of qc, to a circuit on heavy(g), with g=L^-1(cg).
-        cp = QuantumCircuit(max(h.nodes) + 1)
+        cp = QuantumCircuit(plan.num_qubits)
         for inst in qc.data:
             qubits = inst.qubits
             assert (
@@ -172,14 +943,9 @@ def line_graph_route(qc: QuantumCircuit) -> QuantumCircuit:
             elif len(qubits) == 2:
                 i = qc.find_bit(qubits[0]).index
                 j = qc.find_bit(qubits[1]).index
-                path = nx.shortest_path(h, source=i, target=j)
-                assert (
-                    len(path) == 3
-                ), "The path through h=heavy(g) from node i to j of g must touch 3 nodes."
-                m = path[1]
+                m, s = plan.route[(i, j)]
                 if inst.operation.name != "pad":
-                    # Always 'swap in' the qubit with the lowest degree.
-                    if h.degree[i] >= h.degree[j]:
+                    if s == j:
                         cp.swap(j, m)
                         cp.append(inst.replace(qubits=(i, m)))
                         cp.swap(m, j)
@@ -190,23 +956,24 @@ def line_graph_route(qc: QuantumCircuit) -> QuantumCircuit:
 
         return cp
 
-    def remove_lone_leaf(qc, h):
+    def remove_lone_leaf(qc, plan):
         # Return circuit with lone leaf qubits removed accoring to 'agumented line-graph routing'.
         cp = QuantumCircuit(qc.num_qubits)
+        is_lone = plan.is_lone.tolist()
+        leaf_nbr = plan.leaf_nbr.tolist()
 
         for inst in qc.data:
             qubits = inst.qubits
             if len(qubits) == 1:
                 i = qc.find_bit(qubits[0]).index
-                if lone_leaf(h, i):
-                    nbr = list(nx.neighbors(h, i))[0]
-                    cp.append(inst.replace(qubits=(nbr,)))
+                if is_lone[i]:
+                    cp.append(inst.replace(qubits=(leaf_nbr[i],)))
                 else:
                     cp.append(inst)
             elif len(qubits) == 2:
                 i = qc.find_bit(qubits[0]).index
                 j = qc.find_bit(qubits[1]).index
-                if lone_leaf(h, i) or lone_leaf(h, j):
+                if is_lone[i] or is_lone[j]:
                     assert (
                         inst.operation.name == "swap"
                         or inst.operation.name == "pad_swap"
@@ -221,15 +988,11 @@ def line_graph_route(qc: QuantumCircuit) -> QuantumCircuit:
 
         return cp
 
-    def fix_labels(qc, h):
+    def fix_labels(qc, plan):
         # Fix labels of qubits that were before lone leaf so that the old labeling of nodes is retained in the output circuit. This is not essential, but is practical when gates need to be added to the circuit *after* routing.
-        swap_dict = {}
-        for node in h.nodes:
-            if lone_leaf(h, node):
-                nbr = list(nx.neighbors(h, node))
-                assert len(nbr) == 1
-                nbr = nbr[0]
-                swap_dict[nbr] = node
+        swap_dict = {
+            int(plan.leaf_nbr[node]): int(node) for node in np.flatnonzero(plan.is_lone)
+        }
 
         cp = QuantumCircuit(qc.num_qubits)
         for inst in qc.data:
@@ -256,614 +1019,794 @@ def line_graph_route(qc: QuantumCircuit) -> QuantumCircuit:
         return cp
 
     # Apply line-graph routing.
-    cg = coupling_graph(qc)
-    assert nx.is_connected(
-        cg
-    ), "Line-graph routing only implemented for connected connectivity graphs. Route the disconnected circuits seperately or add padding identity gates with pad_gate()"
-    g = nx.inverse_line_graph(cg)
-    h = heavy(g)
-    assert nx.is_connected(h)
-    h = nodes_to_ints(h)
-    qc = resize_register_to(qc, h)
-    start = time()
-    qc = bare_reroute(qc, h)
-    qc = remove_lone_leaf(qc, h)
-    qc = fix_labels(qc, h)
-    qc = DoubleSwapRemover()(qc)
-    qc = OuterSwapRemover()(qc)
-    end = time()
-    qc = remove_idle_qwires(qc)
-
+    timer = stage_timer(stats)
+    if period is not None and not (layered or lazy or return_layout):
+        if stats is not None and plan is None:
+            # The plan is needed for the number of qubits dropped. The coupling graph of qc equals that of the sample periodic_route() builds it from.
+            with timer("coupling graph"):
+                cg = coupling_graph(qc)
+            plan = routing_plan(cg, stats=stats)
+        with timer("periodic route"):
+            routed = periodic_route(qc, period, plan)
+        if stats is not None:
+            stats.count("gates in", len(qc.data))
+            stats.count("swaps out", routed.count_ops().get("swap", 0))
+            stats.count("qubits dropped", plan.num_qubits - routed.num_qubits)
+            stats.count("gates out", len(routed.data))
+            stats.finish()
+        return routed
+    if plan is None:
+        with timer("coupling graph"):
+            cg = coupling_graph(qc)
+        plan = routing_plan(cg, stats=stats)
+    h = plan.h
+    num_logical = qc.num_qubits
+    if stats is not None:
+        stats.count("gates in", len(qc.data))
+    if fused or layered or lazy:
+        source = circuit_gates(qc)
+        if return_layout:
+            # Swaps of qc that are swap_gate are replaced by copies, so that the swaps inserted by routing are those with the operation swap_gate.
+            source = [
+                (SwapGate() if operation is swap_gate else operation, qubits)
+                for operation, qubits in source
+            ]
+        with timer("reroute"):
+            if lazy:
+                gates = list(lazy_reroute(source, plan))
+            elif layered:
+                gates = list(layered_reroute(source, plan, colors))
+            else:
+                gates = list(reroute_gates(source, plan))
+        if stats is not None:
+            # The fused table leaves out the swap and unswap of a gate next to a lone leaf, which the staged path inserts and then removes. These are counted as inserted and removed, so that both paths report the same counts.
+            lone = 0
+            if not lazy:
+                lone = 2 * sum(
+                    len(qubits) == 2
+                    and operation.name != "pad"
+                    and plan.fused[qubits][0] is None
+                    for operation, qubits in circuit_gates(qc)
+                )
+            stats.count(
+                "swaps inserted",
+                sum(op.name == "swap" for op, qubits in gates) + lone,
+            )
+            stats.count("lone-leaf swaps removed", lone)
+        with timer("double-swap removal"):
+            removed = double_swaps(gates)
+        num_double = len(removed)
+        with timer("outer-swap removal"):
+            outer = outer_swaps(gates, skip=removed)
+            if return_layout:
+                double = set(removed)
+            removed |= outer
+            kept = [gate for k, gate in enumerate(gates) if k not in removed]
+        # Idle qubits are left out while writing the output circuit.
+        with timer("idle-wire removal"):
+            used = {q for operation, qubits in kept for q in qubits}
+            qc = gates_to_circuit(kept, plan.num_qubits, used)
+        if return_layout:
+            with timer("layout"):
+                inserted = {
+                    k
+                    for k, (operation, qubits) in enumerate(gates)
+                    if operation is swap_gate
+                }
+                layout = swap_layout(
+                    gates, double, outer, used, plan.num_qubits, num_logical, inserted
+                )
+        if stats is not None:
+            stats.count("double swaps removed", num_double)
+            stats.count("outer swaps removed", len(removed) - num_double)
+            stats.count("qubits dropped", plan.num_qubits - len(used))
+    else:
+        # The operations of qc, which the stages pass on, unlike the swaps they insert.
+        operations = {id(inst.operation) for inst in qc.data} if return_layout else None
+        with timer("resize register"):
+            qc = resize_register_to(qc, h)
+        with timer("reroute"):
+            qc = bare_reroute(qc, plan)
+        swaps = [qc.count_ops().get("swap", 0)] if stats is not None else None
+        with timer("lone-leaf removal"):
+            qc = remove_lone_leaf(qc, plan)
+        with timer("label fixing"):
+            qc = fix_labels(qc, plan)
+        if return_layout:
+            with timer("layout"):
+                gates = list(circuit_gates(qc))
+                double = double_swaps(gates)
+                outer = outer_swaps(gates, skip=double)
+                inserted = {
+                    k
+                    for k, (operation, qubits) in enumerate(gates)
+                    if id(operation) not in operations
+                }
+        if stats is not None:
+            swaps.append(qc.count_ops().get("swap", 0))
+        with timer("double-swap removal"):
+            qc = remove_double_swaps(qc)
+        if stats is not None:
+            swaps.append(qc.count_ops().get("swap", 0))
+        with timer("outer-swap removal"):
+            qc = remove_outer_swaps(qc)
+        if stats is not None:
+            swaps.append(qc.count_ops().get("swap", 0))
+        num_qubits = qc.num_qubits
+        with timer("idle-wire removal"):
+            qc, used = remove_idle_qwires(qc, return_qubits=True)
+        if return_layout:
+            with timer("layout"):
+                layout = swap_layout(
+                    gates, double, outer, used, num_qubits, num_logical, inserted
+                )
+        if stats is not None:
+            stats.count("swaps inserted", swaps[0])
+            stats.count("lone-leaf swaps removed", swaps[0] - swaps[1])
+            stats.count("double swaps removed", swaps[1] - swaps[2])
+            stats.count("outer swaps removed", swaps[2] - swaps[3])
+            stats.count("qubits dropped", num_qubits - qc.num_qubits)
+    if stats is not None:
+        stats.count("swaps out", qc.count_ops().get("swap", 0))
+        stats.count("gates out", len(qc.data))
+        stats.finish()
+
+    if return_layout:
+        return qc, layout
     return qc
 
 
-# The folowing runctions are for demonstration.
+class RoutingSession:
+    """
+    Line-graph route a circuit that grows over time. Gates are added with append(), which returns only the routed gates that follow from them, as (operation, qubits) pairs. The routing plan (heavy graph, lone-leaf data and fused swaps) is computed once, and the session keeps the swap state at the end of the circuit routed so far, so that appending costs time in proportion to the number of new gates. The coupling graph cg of all gates that will ever be appended must be given, or its RoutingPlan as `plan`.
 
+    The same swaps are removed as by line_graph_route(). A swap is held back until it is known to be kept, which is when a gate that is not cancelled follows it on one of its qubits. Whether a swap is cancelled with the next swap, as by DoubleSwapRemover, is known as soon as the next gate on one of its qubits arrives. Held swaps thus form chains, in which every swap is followed by a swap that may still be cancelled. A chain is emitted as soon as its last swap can no longer be cancelled, except for that last swap itself, which is still held. A swap on qubits that no gate has acted on yet is dropped immediately. Gates on other qubits may overtake a held swap, so the order of the gates can differ from that of line_graph_route(), but the circuits are the same, gate by gate on every qubit.
 
-def kagome(n: int, m: int, to_ints: bool = True) -> nx.Graph:
+    If keep is True, the emitted gates are also stored in self.gates, so that circuit() can return the routed circuit of all gates appended so far.
     """
-    Return the kagome graph of n by m unit cells, with 'padded' edges.
-    """
-    base_edges = [
-        ((0, 0, 0), (0, 0, 1)),
-        ((0, 0, 1), (0, 0, 2)),
-        ((0, 0, 2), (0, 0, 0)),
-        ((0, 0, 1), (1, 0, 0)),
-        ((1, 0, 0), (1, 0, 2)),
-        ((1, 0, 2), (1, 1, 0)),
-        ((0, 0, 2), (0, 1, 0)),
-        ((0, 1, 0), (0, 1, 1)),
-        ((0, 1, 1), (1, 1, 0)),
-        ((0, 1, 1), (1, 0, 2)),
-    ]
 
-    edges = []
-    for i in range(n):
-        for j in range(m):
-            for edge in base_edges:
-                v = edge[0]
-                w = edge[1]
-                _v = (v[0] + i, v[1] + j, v[2])
-                _w = (w[0] + i, w[1] + j, w[2])
-                _edge = (_v, _w)
-                edges.append(_edge)
-
-    g = nx.Graph(edges)
-    if to_ints:
-        g = nx.convert_node_labels_to_integers(g)
-    return g
-
-
-def shuriken(n: int, m: int) -> nx.Graph:
-    """
-    Return shuriken graph of n by m shurikens with open boundary conditions.
-    """
-    shuriken = [
-        (0, 1),
-        (1, 2),
-        (1, 3),
-        (2, 3),
-        (3, 4),
-        (3, 5),
-        (4, 5),
-        (5, 6),
-        (5, 7),
-        (6, 7),
-        (7, 0),
-        (7, 1),
-    ]
-    shuriken = nx.Graph(shuriken)
-
-    def new_shuriken(shuriken):
-        mapping = {i: i + 8 for i in shuriken.nodes}
-        ns = nx.relabel_nodes(shuriken, mapping)
-        return ns
-
-    def shuriken_column(n):
-        ns = shuriken  # New shuriken
-        col = shuriken.copy()  # One col of shuriken lattice
-        for row in range(1, n):
-            ns = new_shuriken(ns)
-            col.add_edges_from(ns.edges)
-            ln = (row - 1) * 8 + 6  # lower node of upper shuriken
-            un = row * 8 + 2  # Upper node of lower shuriken
-            col = nx.contracted_nodes(col, ln, un)
-
-        return col
-
-    def append_column(n, cols, newcol):
-        i_max = max(cols.nodes)
-        mapping = {i: i + i_max + 1 for i in newcol.nodes}
-        newcol = nx.relabel_nodes(newcol, mapping)
-        j_max = max(newcol.nodes)
-        cols.add_edges_from(newcol.edges)
-        mergers = [[(i_max - 3) - i * 8, j_max - 7 - i * 8] for i in range(n)]
-        for merger in mergers:
-            cols = nx.contracted_nodes(cols, *merger)
-
-        return cols
-
-    cols = shuriken_column(n)
-    for colind in range(1, m):
-        newcol = shuriken_column(n)
-        cols = append_column(n, cols, newcol)
-
-    cols = nx.convert_node_labels_to_integers(cols)
-    return cols
-
-
-def checkerboard(n: int, m: int) -> nx.Graph:
-    """
-    Return checkerbord graph of 2n by 2m unit cells, with open boundary conditions and padded edges.
-    """
-    n = int(
-        n * 2 + 1
-    )  # Go from size specification by unit cells to specification by nodes.
-    m = int(m * 2 + 1)
-    cb = nx.grid_2d_graph(n, m)
-    for i in range(0, n - 1, 2):
-        for j in range(0, m - 1, 2):
-            cb.add_edge((i, j), (i + 1, j + 1))
-            cb.add_edge((i + 1, j), (i, j + 1))
-    for i in range(1, n - 1, 2):
-        for j in range(1, m - 1, 2):
-            cb.add_edge((i, j), (i + 1, j + 1))
-            cb.add_edge((i + 1, j), (i, j + 1))
-
-    cb = nx.convert_node_labels_to_integers(cb)
-    return cb
-
-
-def heavy_square(n, m):
-    """
-    Return heavy square graph with padded edges.
-    """
-    base_edges = [
-        ((0, 0, 0), (0, 0, 1)),
-        ((0, 0, 0), (0, 0, 2)),
-        ((0, 0, 1), (1, 0, 0)),
-        ((1, 0, 0), (1, 0, 2)),
-        ((1, 0, 2), (1, 1, 0)),
-        ((1, 1, 0), (0, 1, 1)),
-        ((0, 1, 1), (0, 1, 0)),
-        ((0, 1, 0), (0, 0, 2)),
-    ]
-
-    edges = []
-    for i in range(n):
-        for j in range(m):
-            for edge in base_edges:
-                v = edge[0]
-                w = edge[1]
-                _v = (v[0] + i, v[1] + j, v[2])
-                _w = (w[0] + i, w[1] + j, w[2])
-                _edge = (_v, _w)
-                edges.append(_edge)
+    def __init__(self, cg: nx.Graph = None, plan: RoutingPlan = None, keep=True):
+        if plan is None:
+            plan = routing_plan(cg)
+        self.plan = plan
+        # The last held swap on every qubit. A held swap is a list [operation, qubits, qubits first acted upon by it, the held swaps before it on its qubits (or None), whether it may still be cancelled, whether it was emitted, its number].
+        self.held = {}
+        self.touched = set()  # Qubits acted upon by gates that are not removed.
+        self.gates = [] if keep else None
+        self.num_held = 0  # The number of swaps held so far.
+
+    def emit(self, swap):
+        """
+        Yield the held swap `swap`, after the held swaps before it, unless it was emitted already, and stop holding them.
+        """
+        if swap[5]:
+            return
+        for before in swap[3]:
+            if before is not None:
+                yield from self.emit(before)
+        swap[5] = True
+        for q in swap[1]:
+            if self.held.get(q) is swap:
+                del self.held[q]
+        yield swap[0], swap[1]
+
+    def feed(self, gates):
+        """
+        Route `gates`, a QuantumCircuit or an iterable of (operation, qubits) pairs with qubits a tuple of ints (such as circuit_gates(qc)), and yield the newly routed gates as (operation, qubits) pairs.
+        """
+        if isinstance(gates, QuantumCircuit):
+            gates = circuit_gates(gates)
+        held = self.held
+        touched = self.touched
+        for operation, qubits in reroute_gates(gates, self.plan):
+            if operation.name == "swap":
+                a, b = qubits
+                swap = held.get(a)
+                if swap is not None and swap is held.get(b) and swap[4]:
+                    # Cancel with the held swap. The swaps before it are the last held swaps on its qubits again, and the qubits it acted on first are untouched again.
+                    for q, before in zip(swap[1], swap[3]):
+                        if before is None or before[5]:
+                            del held[q]
+                        else:
+                            held[q] = before
+                    touched.difference_update(swap[2])
+                    continue
+                if touched.isdisjoint(qubits):
+                    continue
+            for q in qubits:
+                swap = held.get(q)
+                if swap is not None and swap[4]:
+                    # The held swap can no longer be cancelled, so the held swaps before it are kept.
+                    swap[4] = False
+                    for before in swap[3]:
+                        if before is not None:
+                            yield from self.emit(before)
+            if operation.name == "swap":
+                new = tuple(q for q in qubits if q not in touched)
+                before = (held.get(a), held.get(b))
+                swap = [operation, qubits, new, before, True, False, self.num_held]
+                self.num_held += 1
+                held[a] = held[b] = swap
+                touched.update(qubits)
+            else:
+                for q in qubits:
+                    swap = held.get(q)
+                    if swap is not None:
+                        yield from self.emit(swap)
+                touched.update(qubits)
+                yield operation, qubits
+
+    def pending(self):
+        """
+        Return the pair of lists of the held swaps that are kept, and that are removed as trailing swaps, if no more gates are appended, in the order in which they were held. The kept swaps are those followed by another held swap, which is then not cancelled.
+        """
+        found = {}
+        stack = list(self.held.values())
+        while stack:
+            swap = stack.pop()
+            if id(swap) not in found and not swap[5]:
+                found[id(swap)] = swap
+                stack.extend(before for before in swap[3] if before is not None)
+        followed = {
+            id(before)
+            for swap in found.values()
+            for before in swap[3]
+            if before is not None
+        }
+        held = sorted(found.values(), key=lambda swap: swap[6])
+        kept = [swap for swap in held if id(swap) in followed]
+        trailing = [swap for swap in held if id(swap) not in followed]
+        return kept, trailing
+
+    def tail(self) -> list:
+        """
+        Return the held swaps that are kept if no more gates are appended (see pending()), as (operation, qubits) pairs.
+        """
+        return [(swap[0], swap[1]) for swap in self.pending()[0]]
+
+    def append(self, gates):
+        """
+        Append `gates` (see feed()) to the session and return the list of newly routed gates.
+        """
+        tail = list(self.feed(gates))
+        if self.gates is not None:
+            self.gates.extend(tail)
+        return tail
+
+    def circuit(self):
+        """
+        Return the routed circuit of all gates appended so far, without idle qubits, as line_graph_route() would. Of the held swaps, those of tail() are included. Requires keep=True.
+        """
+        assert self.gates is not None, "Session was created with keep=False."
+        kept, trailing = self.pending()
+        used = set(self.touched)
+        for swap in trailing:
+            used.difference_update(swap[2])
+        gates = self.gates + [(swap[0], swap[1]) for swap in kept]
+        return gates_to_circuit(gates, self.plan.num_qubits, used)
+
+
+def line_graph_route_stream(gates, cg: nx.Graph = None, plan: RoutingPlan = None):
+    """
+    Streaming variant of line_graph_route(). Line-graph route `gates`, an iterable of (operation, qubits) pairs with qubits a tuple of ints (such as circuit_gates(qc)), and yield the routed gates as (operation, qubits) pairs. The coupling graph cg of the gates must be given, or its RoutingPlan as `plan`, since it cannot be obtained from the stream without storing it.
 
-    g = nx.Graph(edges)
-    g = nx.convert_node_labels_to_integers(g)
-    return g
+    Swaps are removed as in RoutingSession, and of the swaps that are still held at the end of the stream, those of RoutingSession.tail() are yielded last. The routed gates are those of line_graph_route(), gate by gate on every qubit. Idle qubits are not removed, so the qubits of the output are the nodes of plan.h.
+    """
+    session = RoutingSession(cg, plan, keep=False)
+    yield from session.feed(gates)
+    yield from session.tail()
 
 
-def random_line_graph(n: int) -> nx.Graph:
+class GateArrays:
     """
-    Create an Erdos-Renyi graph on n nodes and return its line graph.
+    Compact representation of a circuit of one- and two-qubit gates on num_qubits qubits as parallel numpy arrays. Gate k has the name names[opcode[k]], acts on the qubits q0[k] and q1[k], with q1[k] = -1 for one-qubit gates, and is the operation operations[param[k]]. The operations carry the parameters of the gates, and are shared with the circuit the arrays were made from. Use circuit_to_arrays() and arrays_to_circuit() to convert from and to QuantumCircuits.
     """
-    g = nx.erdos_renyi_graph(n, 2 / 3)  # Connected with high probability
-    while not nx.is_connected(g):
-        g = nx.erdos_renyi_graph(n, 2 * np.log(n) / n)
-    l = nx.line_graph(g)
-    l = nx.convert_node_labels_to_integers(l)
-    return l
 
+    def __init__(self, opcode, q0, q1, param, names, operations, num_qubits):
+        self.opcode = opcode
+        self.q0 = q0
+        self.q1 = q1
+        self.param = param
+        self.names = names
+        self.operations = operations
+        self.num_qubits = num_qubits
+
+    def __len__(self):
+        return len(self.opcode)
+
+    def code(self, name: str) -> int:
+        # Return the opcode of the gate name, or -1 if no gate has that name.
+        if name not in self.names:
+            return -1
+        return self.names.index(name)
 
-def random_circuit(g, m):
+
+def circuit_to_arrays(qc: QuantumCircuit) -> GateArrays:
     """
-    Return a qiskit quantum circuit with with connectivity graph g and m random 2-qubit Clifford + T gates.
+    Return the GateArrays of the QuantumCircuit qc, which must consist of one- and two-qubit gates.
     """
-    if not all(type(node) == int for node in g.nodes):
-        print("warning: converting all nodes to integers")
-        g = nx.convert_node_labels_to_integers(g)
-    edges = list(g.edges)
-    n = len(g.nodes)
-    # List of gates to choose from. Make the prob. of choosing CNOT higher because these are the interesting gates in a routing problem.
-    gates = [qkcirc.library.CXGate()] * 2 + [
-        qkcirc.library.HGate(),
-        qkcirc.library.SGate(),
-        qkcirc.library.TGate(),
-    ]
+    index = {qubit: k for k, qubit in enumerate(qc.qubits)}
+    codes = {}
+    params = {}
+    operations = []
+    n = len(qc.data)
+    opcode = np.empty(n, dtype=np.int32)
+    q0 = np.empty(n, dtype=np.int32)
+    q1 = np.full(n, -1, dtype=np.int32)
+    param = np.empty(n, dtype=np.int32)
+    for k, inst in enumerate(qc.data):
+        operation = inst.operation
+        qubits = inst.qubits
+        if len(qubits) == 2:
+            q1[k] = index[qubits[1]]
+        elif len(qubits) != 1:
+            raise ValueError(
+                "GateArrays only represent circuits consisting out of one- and two-qubit gates."
+            )
+        q0[k] = index[qubits[0]]
+        opcode[k] = codes.setdefault(operation.name, len(codes))
+        key = id(operation)
+        if key not in params:
+            params[key] = len(operations)
+            operations.append(operation)
+        param[k] = params[key]
+    return GateArrays(opcode, q0, q1, param, list(codes), operations, qc.num_qubits)
 
-    def append_random_instruction_to(qc):
-        gate = rand.choice(gates)
-        qint = rand.randint(0, n - 1)
-        if gate.num_qubits == 1:
-            q = rand.randint(0, n - 1)
-            qc.append(gate, (q,))
-        elif gate.num_qubits == 2:
-            qs = rand.choice(edges)
-            qc.append(gate, qs)
 
-    qc = QuantumCircuit(n)
+def arrays_to_circuit(ga: GateArrays, compact: bool = False) -> QuantumCircuit:
+    """
+    Return the QuantumCircuit of the GateArrays ga. If compact==True, idle qubits are left out, as in remove_idle_qwires().
+    """
+    used = None
+    if compact:
+        qubits = np.concatenate((ga.q0, ga.q1[ga.q1 >= 0]))
+        used = np.unique(qubits).tolist()
+    operations = ga.operations
 
-    for _ in range(m):
-        append_random_instruction_to(qc)
+    def gates():
+        for p, a, b in zip(ga.param.tolist(), ga.q0.tolist(), ga.q1.tolist()):
+            yield operations[p], (a,) if b < 0 else (a, b)
 
-    return qc
+    return gates_to_circuit(gates(), ga.num_qubits, used)
 
 
-def pad_gate() -> QuantumCircuit:
+def arrays_coupling_graph(ga: GateArrays) -> nx.Graph:
     """
-    The current implementation of line-graph routing assumes circuits with connected connectiviy graphs. The pad gate can be added to a circuit with a disconnected connectivity graph to make it connected.
+    Return the coupling graph of the GateArrays ga. Equals coupling_graph() of the corresponding circuit, including the order of its nodes and edges.
     """
-    qc = QuantumCircuit(2, name="pad")
-    return qc
+    two = ga.q1 >= 0
+    # All qubits in the order in which gates act on them.
+    qubits = np.stack((ga.q0, np.where(two, ga.q1, ga.q0)), axis=1).ravel()
+    nodes, first = np.unique(qubits, return_index=True)
+    nodes = nodes[np.argsort(first)]
+    lo = np.minimum(ga.q0[two], ga.q1[two]).astype(np.int64)
+    hi = np.maximum(ga.q0[two], ga.q1[two]).astype(np.int64)
+    keys, first = np.unique(lo * ga.num_qubits + hi, return_index=True)
+    first = np.sort(first)
+    cg = nx.Graph()
+    cg.add_nodes_from(nodes.tolist())
+    cg.add_edges_from(zip(ga.q0[two][first].tolist(), ga.q1[two][first].tolist()))
+    assert nodes.min() == 0, "Lowest node int must be 0."
+    return cg
 
 
-def prepare_singlet() -> QuantumCircuit:
+def reroute_arrays(ga: GateArrays, plan: RoutingPlan) -> GateArrays:
     """
-    Return qiskit circuit that prepares the two-qubit singlet state.
+    Array version of reroute_gates(). Return the GateArrays of the line-graph rerouted ga, according to the RoutingPlan plan. Every gate is looked up in plan.edge_table by a binary search over the edge keys, and all gates are expanded into their swap, gate and unswap at once, by scattering them into the output arrays at offsets given by a cumulative sum of the number of output gates of every input gate.
     """
-    qc = QuantumCircuit(2, name="singlet")
-    qc.h(0)
-    qc.z(0)
-    qc.x(1)
-    qc.cnot(0, 1)
-    return qc
-
+    n = plan.num_qubits
+    relabel = np.asarray(plan.relabel)
+    # The names of the output, with "swap" added if needed, without changing ga.
+    names = list(ga.names)
+    if "swap" not in names:
+        names.append("swap")
+    swap_code = names.index("swap")
+    two = ga.q1 >= 0
+    pad = ga.opcode == ga.code("pad")
+    keys = ga.q0[two].astype(np.int64) * n + ga.q1[two]
+    rows = np.minimum(np.searchsorted(plan.edge_keys, keys), len(plan.edge_keys) - 1)
+    if not np.array_equal(plan.edge_keys[rows], keys):
+        raise ValueError("The gates of ga do not match the coupling graph of plan.")
+    table = plan.edge_table[rows]
+
+    # Number of output gates of every input gate.
+    has_swap = np.zeros(len(ga), dtype=bool)
+    has_swap[two] = table[:, 0] >= 0
+    counts = np.where(two, 1 + 2 * has_swap, 1)
+    counts[pad] = 0
+    starts = np.cumsum(counts) - counts
+    total = int(counts.sum())
+
+    opcode = np.full(total, swap_code, dtype=np.int32)
+    param = np.full(total, len(ga.operations), dtype=np.int32)
+    q0 = np.empty(total, dtype=np.int32)
+    q1 = np.empty(total, dtype=np.int32)
+
+    keep = counts > 0
+    at = starts[keep] + has_swap[keep]
+    opcode[at] = ga.opcode[keep]
+    param[at] = ga.param[keep]
+    q0[at] = np.where(two, 0, relabel[ga.q0])[keep]
+    q1[at] = -1
+    gate = two & keep
+    at = starts[gate] + has_swap[gate]
+    q0[at], q1[at] = table[~pad[two], 2], table[~pad[two], 3]
+    swapped = two & has_swap & keep
+    rows = table[(has_swap & keep)[two]]
+    at = starts[swapped]
+    q0[at], q1[at] = rows[:, 0], rows[:, 1]
+    q0[at + 2], q1[at + 2] = rows[:, 4], rows[:, 5]
+
+    return GateArrays(opcode, q0, q1, param, names, ga.operations + [swap_gate], n)
+
+
+def array_swaps(ga: GateArrays) -> np.ndarray:
+    """
+    Array version of double_swaps() followed by outer_swaps(). Return a boolean mask of the swap gates of ga that DoubleSwapRemover followed by OuterSwapRemover would remove.
+    """
+    n = len(ga)
+    is_swap = ga.opcode == ga.code("swap")
+    two = ga.q1 >= 0
+    # Incidences of gates and qubits, sorted by qubit and then by position.
+    pos = np.concatenate((np.arange(n), np.flatnonzero(two)))
+    qub = np.concatenate((ga.q0, ga.q1[two]))
+    order = np.lexsort((pos, qub))
+    pos, qub = pos[order], qub[order]
+    same = qub[1:] == qub[:-1]
+    nxt = np.full(len(pos), -1)
+    nxt[:-1] = np.where(same, pos[1:], -1)
+    # The next gate on either qubit of every gate. Equal for both qubits for a swap that is directly followed by a swap on the same qubits.
+    after = np.full((n, 2), -1)
+    lo = np.minimum(ga.q0, np.where(two, ga.q1, ga.q0))
+    on_lo = qub == lo[pos]
+    after[pos[on_lo], 0] = nxt[on_lo]
+    after[pos[~on_lo], 1] = nxt[~on_lo]
+    # Links k -> t between swaps that cancel if k is not itself cancelled, at incidence on the lowest qubit of k.
+    t = nxt[on_lo]
+    k = pos[on_lo]
+    link = np.zeros(len(pos), dtype=bool)
+    link[np.flatnonzero(on_lo)] = (
+        is_swap[k] & two[k] & (t >= 0) & (after[k, 1] == t) & is_swap[np.maximum(t, 0)]
+    )
+    # Consecutive links form chains of swaps on the same qubits, of which the first and second, third and fourth, etc. cancel. Chain links are consecutive incidences, so that the position in the chain follows from the start of the run of links.
+    idx = np.arange(len(pos))
+    start = link & ~np.concatenate(([False], link[:-1]))
+    run_start = np.maximum.accumulate(np.where(start, idx, 0))
+    take = link & ((idx - run_start) % 2 == 0)
+    removed = np.zeros(n, dtype=bool)
+    removed[pos[take]] = True
+    removed[nxt[take]] = True
+
+    # Trailing swaps are the last remaining gate on both their qubits.
+    kept = ~removed[pos]
+    last = np.full(ga.num_qubits, -1)
+    np.maximum.at(last, qub[kept], pos[kept])
+    trailing = is_swap & two & ~removed
+    trailing &= (last[ga.q0] == np.arange(n)) & (
+        last[np.maximum(ga.q1, 0)] == np.arange(n)
+    )
 
-def heis_gate(alpha: Parameter) -> QuantumCircuit:
-    """
-    Return HEIS gate as qiskit circuit with qiskit.circuit.Parameter alpha
-    """
-    qc = QuantumCircuit(2, name="heis")
-    qc.sx(1)
-    qc.rz(-np.pi, 0)
-    qc.sx(0)
-    qc.rz(-np.pi / 2, 0)
-    qc.cnot(0, 1)
-    qc.rx(np.pi / 2, 0)
-    qc.rz(-alpha / 2, 1)
-    qc.rz(np.pi / 2 + alpha / 2, 0)
-    qc.cnot(0, 1)
-    qc.rx(np.pi / 2, 0)
-    qc.rz(alpha / 2, 1)
-    qc.cnot(0, 1)
-    qc.x(0)
-    qc.x(1)
-    qc.rz(-np.pi / 2, 0)
-    return qc
+    # Leading swaps act on qubits that no remaining gate acted upon before. Only the gates up to the point where all qubits are touched are visited.
+    untouched = set(np.unique(qub[kept]).tolist())
+    leading = np.zeros(n, dtype=bool)
+    for k in np.flatnonzero(~removed).tolist():
+        if not untouched:
+            break
+        a = int(ga.q0[k])
+        b = int(ga.q1[k])
+        if is_swap[k] and a in untouched and b in untouched:
+            leading[k] = True
+        else:
+            untouched.discard(a)
+            untouched.discard(b)
+    return removed | trailing | leading
 
 
-def edge_coloring(g: nx.Graph, verbose=True) -> nx.Graph:
+def line_graph_route_arrays(ga: GateArrays, plan: RoutingPlan = None) -> GateArrays:
     """
-    Return an edge coloring of the networkx.Graph g as a networkx.Graph with 'color' edge attributes. Color 0 forms a perfect
-    matching. If such a perfect matching was not found (which does not mean it does not exist) an assertion error is raised.
-    Color 0 forms a perfect matching for many patches, including those of m x m unit cells, with m odd and arbitrarily large.
-    Does not return a perfect matching for all patches, for example patches with m x m unit cells with m even.
+    Array version of line_graph_route(). Return the GateArrays of the line-graph routed ga, with superflous swaps removed. Idle qubits are kept; use arrays_to_circuit(..., compact=True) to leave them out, which gives the same circuit as line_graph_route(). If no RoutingPlan is passed, it is obtained from routing_plan().
     """
-    line = nx.line_graph(g)
-    # To obtain an _edge_ coloring of g, we use the fact that a vertex coloring of the line graph of g is equivalent to an edge coloring of g.
-    coloring = nx.greedy_color(line, strategy="independent_set")
-    nx.set_edge_attributes(g, coloring, "color")
-    matching = {edge[:2] for edge in g.edges(data=True) if edge[2]["color"] == 0}
-    if nx.is_perfect_matching(g, matching):
-        if verbose == True:
-            print("Matching is perfect")
-    else:
-        raise Exception(
-            "No perfect matching found, try another method for coloring the graph."
-        )
+    if plan is None:
+        plan = routing_plan(arrays_coupling_graph(ga))
+    ga = reroute_arrays(ga, plan)
+    keep = ~array_swaps(ga)
+    return GateArrays(
+        ga.opcode[keep],
+        ga.q0[keep],
+        ga.q1[keep],
+        ga.param[keep],
+        ga.names,
+        ga.operations,
+        ga.num_qubits,
+    )
 
-    colors = [g[u][v]["color"] for u, v in g.edges]
-    degree = max(dict(g.degree()).values())
-    if max(colors) == degree - 1:  # Specific to Vizing class I graphs
-        if verbose == True:
-            print("Edge coloring is minimal")
-    else:
-        if verbose == True:
-            print("Edge coloring is not minimal")
-    return g
-
-
-def draw_edge_coloring(g: nx.Graph, with_labels=False, spectral=False) -> None:
-    colors = [g[u][v]["color"] for u, v in g.edges]
-    if max(colors) <= 4:  # Specific to kagome
-        # Use custom edge colors
-        blue, orange, red, green, purple, grey = (
-            "#1f77b4",
-            "#ff7f0e",
-            "#2ca02c",
-            "#d62728",
-            "#9467bd",
-            "#d3d3d3",
-        )
-        color_map = {0: blue, 4: purple, 3: orange, 2: green, 1: red}
-        for ind, color in enumerate(colors):
-            colors[ind] = color_map[color]
 
-    if spectral == False:
-        nx.draw_kamada_kawai(
-            g, edge_color=colors, width=5, node_size=20, with_labels=with_labels
-        )
-    elif spectral == True:
-        nx.draw_spectral(
-            g, edge_color=colors, width=5, node_size=20, with_labels=with_labels
-        )
+def arrays_count_ops(ga: GateArrays) -> dict:
+    """
+    Return the number of gates of every name in the GateArrays ga, as QuantumCircuit.count_ops() does, without building the operations. The number of swaps is arrays_count_ops(ga).get("swap", 0).
+    """
+    counts = np.bincount(ga.opcode, minlength=len(ga.names)).tolist()
+    counts = [(name, c) for name, c in zip(ga.names, counts) if c > 0]
+    return OrderedDict(sorted(counts, key=lambda x: x[1], reverse=True))
 
 
-def heis_circuit(g: nx.Graph, p: int, cnot_circ: bool = False) -> QuantumCircuit:
+def arrays_depth(ga: GateArrays) -> int:
     """
-    Return parameterized ansatz qiskit circuit for the HAFM on the networkx.Graph g, with p cycles. The edges
-    of g must have a 'color' attribute that specifies the color by an int, the lowest color being 0. Singlets
-    are created along those edges with color 0. Subsequently, HEIS gates are added for the colors c-1,..., 0 in
-    sequence, with c the number of different edge colors. This (excluding singlet preparation) is repeated p times.
-    This means that for $p = 0$, only the initial state is prepared.
-
-    If cnot_circ==True, each gate is a cnot. This results to a circtuit structurally equivalent to the heis_circtuit. Mainly for interfacing with OLSQ2.
+    Return the depth of the circuit of the GateArrays ga, as QuantumCircuit.depth() does, without building the operations.
     """
-    n = len(g.nodes())
-    edges = list(g.edges(data=True))
-    edges = [
-        edge if edge[0] < edge[1] else (edge[1], edge[0], edge[2]) for edge in edges
-    ]
-    # Sort edges by color.
-    sorted_edges = sorted(edges, key=lambda e: e[2]["color"])
-    sorted_edges = list(reversed(sorted_edges))  # Put 'high' colors first.
-    qc = QuantumCircuit(n)
-
-    # Prepare the initial state.
-    for edge in sorted_edges:
-        if edge[2]["color"] == 0:
-            gate = prepare_singlet() if not cnot_circ else qkcirc.library.CXGate()
-            qc.append(gate, edge[:2])
-
-    # Add p cycles of parameterized gates.
-    par_count = 0
-    for _ in range(p):
-        for edge in sorted_edges:
-            par = Parameter("al_{}".format(par_count))
-            gate = heis_gate(par) if not cnot_circ else qkcirc.library.CXGate()
-            qc.append(gate, edge[:2])
-            par_count += 1
-
-    # Our routing technique, explained later, assumes circuits with a connected coupling graph. If p = 0, pad the circuit with identity gates to make the coupling graph connected.
-    if p == 0:
-        for edge in sorted_edges:
-            qc.append(pad_gate(), edge[:2])
+    level = [0] * ga.num_qubits
+    for a, b in zip(ga.q0.tolist(), ga.q1.tolist()):
+        if b < 0:
+            level[a] += 1
+        else:
+            level[a] = level[b] = max(level[a], level[b]) + 1
+    return max(level, default=0)
 
-    return qc
 
+routed_magic = b"LGRROUTE"
+routed_version = 1
+routed_alignment = 64
 
-def benchmark(
-    name="kagome",
-    size=(1, 1),
-    circuit_type="quantum_simulation",
-    p=1,
-    repetitions=16,
-    optimization_level=1,
-    methods=["sabre"],
-):
-    """
-    Run benchmark. Parameters as described in the notebook line_graph_routing.ipynb.
-    There is a bug in Qiskit causing the method `lookahead` to run for more than an hour even for the 1x1 kagome patch with a quantum simulation circuit of p=1.
-    """
-
-    def get_num_swaps(qc):
-        return qc.count_ops()["swap"]
-
-    if name == "kagome":
-        lg = kagome(*size)
-    elif name == "shuriken":
-        lg = shuriken(*size)
-    elif name == "checkerboard":
-        lg = checkerboard(*size)
-    elif name == "complete":
-        lg = nx.complete_graph(size)
-
-    if circuit_type == "quantum_simulation":
-        lg = edge_coloring(lg, verbose=False)
-        qc = heis_circuit(lg, p)
-        basis_gates = ["swap", "singlet", "heis"]
-    elif circuit_type == "random":
-        qc = random_circuit(lg, p)
-        basis_gates = ["swap", "cx", "h", "s", "t"]
-
-    # print('input circuit:')
-    # print(qc.draw(fold=-1))
-    table = []
 
-    # Line-graph route the quantum simulation circuit.
-    method = "line-graph"
-    start = time()
-    qc_lgr = line_graph_route(qc)
-    end = time()
-    # print('line-graph routed:')
-    # print(qc_lgr.draw(fold=-1))
-
-    table.append(
-        {
-            "method": method,
-            "num_swaps": get_num_swaps(qc_lgr),
-            "num_swaps_CI": 0,
-            "min_swaps": get_num_swaps(qc_lgr),
-            "depth": qc_lgr.depth(),
-            "depth_CI": 0,
-            "min_depth": qc_lgr.depth(),
-            "num_qubits": qc_lgr.num_qubits,
-            "num_qubits_CI": 0,
-            "min_qubits": qc_lgr.num_qubits,
-            "total_wall_clock": np.round(end - start, 2),
-            "wall_clock": np.round(end - start, 2),
-            "wall_clock_CI": 0,
-            "min_wall_clock": np.round(end - start, 2),
-        }
-    )
+def save_routed(path, circuit) -> None:
+    """
+    Write `circuit`, a QuantumCircuit of one- and two-qubit gates or its GateArrays (such as a circuit routed by line_graph_route() or line_graph_route_arrays()), to the file at `path` in a compact binary format that load_routed() memory-maps.
 
-    # Specify hardware coupling map for the other routing methods.
-    # Convenient way of getting the target coupling graph.
-    cg_lgr = coupling_graph(qc_lgr)
-    cg_lgr = nx.convert_node_labels_to_integers(cg_lgr)
-    couplinglist = list(cg_lgr.edges)
-    couplinglist = couplinglist + [edge[::-1] for edge in cg_lgr.edges]
-    coupling_map = CouplingMap(couplinglist=couplinglist)
-
-    # preset_passmanagers.plugin.list_stage_plugins('routing')
-    for method in methods:
-        # print('Running',method,'routing method')
-        wall_clocks = []
-        num_qubits = []
-        num_swaps = []
-        depths = []
-        if method == "basic":
-            reps = 1
-        else:
-            reps = repetitions
-        for rep in range(reps):
-            start = time()
-            qc_alt = transpile(
-                qc,
-                routing_method=method,
-                coupling_map=coupling_map,
-                basis_gates=basis_gates,
-                optimization_level=optimization_level,
-            )
-            end = time()
-            qc_alt = remove_idle_qwires(qc_alt)
-            qc_alt = DoubleSwapRemover()(qc_alt)
-            qc_alt = OuterSwapRemover()(qc_alt)
-            wall_clocks.append(np.round(end - start, 2))
-            num_qubits.append(qc_alt.num_qubits)
-            num_swaps.append(get_num_swaps(qc_alt))
-            depths.append(qc_alt.depth())
-
-        # print('alt routed:')
-        # print(qc_alt.draw(fold=-1))
-
-        if method == "basic":
-            wall_clock_CI = 0
-            num_qubits_CI = 0
-            num_swaps_CI = 0
-            depth_CI = 0
-        else:
-            wall_clock_bs = bootstrap([wall_clocks], np.mean)
-            wall_clock_low = wall_clock_bs.confidence_interval.low
-            wall_clock_high = wall_clock_bs.confidence_interval.high
-            wall_clock_CI = wall_clock_high - wall_clock_low
-
-            num_qubits_bs = bootstrap([num_qubits], np.mean)
-            num_qubits_low = num_qubits_bs.confidence_interval.low
-            num_qubits_high = num_qubits_bs.confidence_interval.high
-            num_qubits_CI = num_qubits_high - num_qubits_low
-
-            num_swaps_bs = bootstrap([num_swaps], np.mean)
-            num_swaps_low = num_swaps_bs.confidence_interval.low
-            num_swaps_high = num_swaps_bs.confidence_interval.high
-            num_swaps_CI = num_swaps_high - num_swaps_low
-
-            depth_bs = bootstrap([depths], np.mean)
-            depth_low = depth_bs.confidence_interval.low
-            depth_high = depth_bs.confidence_interval.high
-            depth_CI = depth_high - depth_low
-
-        min_run = depths.index(min(depths))
+    The file starts with the magic bytes b"LGRROUTE", the length of a JSON header as an 8-byte little-endian integer, and the header. The header holds the number of qubits and gates, the gate names, the table of distinct operations with their names, numbers of qubits and parameters, and the table of parameter names. Parameters are stored as numbers, or as indices into the parameter-name table for free Parameters; other parameter expressions are not supported. The header is followed, at an offset aligned to 64 bytes, by the arrays opcode, q0, q1 and param of the GateArrays, each stored as little-endian int32.
+    """
+    ga = circuit if isinstance(circuit, GateArrays) else circuit_to_arrays(circuit)
+    parameters = {}  # The index of every parameter name.
+    table = []
+    for operation in ga.operations:
+        params = []
+        for value in operation.params:
+            if isinstance(value, Parameter):
+                params.append(
+                    {"parameter": parameters.setdefault(value.name, len(parameters))}
+                )
+            elif isinstance(value, ParameterExpression):
+                raise ValueError(
+                    "save_routed() only stores numeric parameters and free Parameters."
+                )
+            else:
+                params.append(float(value))
         table.append(
             {
-                "method": method,
-                "num_swaps": get_num_swaps(qc_alt),
-                "num_swaps_CI": num_swaps_CI,
-                "min_swaps": num_swaps[min_run],
-                "depth": np.mean(depths),
-                "depth_CI": depth_CI,
-                "min_depth": depths[min_run],
-                "num_qubits": np.mean(num_qubits),
-                "num_qubits_CI": num_qubits_CI,
-                "min_qubits": num_qubits[min_run],
-                "total_wall_clock": sum(wall_clocks),
-                "wall_clock": np.mean(wall_clocks),
-                "wall_clock_CI": wall_clock_CI,
-                "min_wall_clock": wall_clocks[min_run],
+                "name": operation.name,
+                "num_qubits": operation.num_qubits,
+                "params": params,
             }
         )
+    header = {
+        "version": routed_version,
+        "num_qubits": ga.num_qubits,
+        "num_gates": len(ga),
+        "names": list(ga.names),
+        "operations": table,
+        "parameters": list(parameters),
+    }
+    text = json.dumps(header).encode()
+    size = len(routed_magic) + 8 + len(text)
+    padding = -size % routed_alignment
+    with open(path, "wb") as f:
+        f.write(routed_magic)
+        f.write(len(text).to_bytes(8, "little"))
+        f.write(text)
+        f.write(b" " * padding)
+        for array in (ga.opcode, ga.q0, ga.q1, ga.param):
+            np.asarray(array).astype("<i4", copy=False).tofile(f)
+
+
+class StoredOperations:
+    """
+    The operations of a file written by save_routed(), as a sequence that builds every operation when it is first accessed. Swaps are the shared swap_gate. The gates "heis", "singlet" and "pad" are rebuilt by heis_gate(), prepare_singlet() and pad_gate(), and other gates by the Qiskit standard gate of the same name. Gates that are neither are rebuilt as opaque Gates with the stored name, number of qubits and parameters. Parameters with the same name are the same Parameter object.
+    """
 
-    return [name, size, circuit_type, p, repetitions, optimization_level], table
-
-
-def print_benchmark(result):
-    option, table = result
-    # table.sort(key=lambda x: x['num_swaps'])
-    formatted_table = []
-
-    def pm_format(lst, key, pm_key):
-        s = "{} \u00b1 {}".format(np.round(lst[key], 2), np.round(lst[pm_key] / 2, 2))
-        return s
-
-    for line in table:
-        newline = [
-            line["method"],
-            pm_format(line, "num_swaps", "num_swaps_CI"),
-            line["min_swaps"],
-            pm_format(line, "depth", "depth_CI"),
-            line["min_depth"],
-            pm_format(line, "num_qubits", "num_qubits_CI"),
-            line["min_qubits"],
-            line["total_wall_clock"],
-            pm_format(line, "wall_clock", "wall_clock_CI"),
-            line["min_wall_clock"],
+    def __init__(self, table: list, parameters: list):
+        self.table = table
+        self.parameters = parameters
+        self.built = [None] * len(table)
+        self.parameter_objects = {}
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, k: int):
+        operation = self.built[k]
+        if operation is None:
+            operation = self.build(self.table[k])
+            self.built[k] = operation
+        return operation
+
+    def parameter(self, k: int) -> Parameter:
+        # Return the Parameter with name self.parameters[k].
+        name = self.parameters[k]
+        if name not in self.parameter_objects:
+            self.parameter_objects[name] = Parameter(name)
+        return self.parameter_objects[name]
+
+    def build(self, entry: dict):
+        # Rebuild the operation of the entry of the operation table.
+        name = entry["name"]
+        num_qubits = entry["num_qubits"]
+        params = [
+            self.parameter(value["parameter"]) if isinstance(value, dict) else value
+            for value in entry["params"]
         ]
-        formatted_table.append(newline)
-
-    headers = [
-        "method",
-        "av. n_swaps",
-        "min. n_swap",
-        "av. depth",
-        "min. depth",
-        "av. n_qubits",
-        "min. qubits",
-        "total time (s)",
-        "av. time (s)",
-        "min. time (s)",
-    ]
-    print_table = tabulate(formatted_table, headers=headers)
-
-    print("{\\tiny")
-    print("-" * 150)
-    print(
-        "name = {}, size = {}, circuit_type = {}, p = {}, repetitions = {}, optimization_level = {}".format(
-            *option
+        if name == "swap" and num_qubits == 2:
+            return swap_gate
+        if name in ("heis", "singlet", "pad"):
+            lattices = importlib.import_module("lgr_lattices")
+            builder = {
+                "heis": lattices.heis_gate,
+                "singlet": lattices.prepare_singlet,
+                "pad": lattices.pad_gate,
+            }[name]
+            return builder(*params).to_instruction()
+        standard = get_standard_gate_name_mapping().get(name)
+        if (
+            standard is not None
+            and standard.num_qubits == num_qubits
+            and len(standard.params) == len(params)
+        ):
+            return type(standard)(*params)
+        return Gate(name, num_qubits, params)
+
+
+def load_routed(path) -> GateArrays:
+    """
+    Return the GateArrays of the circuit in the file at `path`, written by save_routed(). The arrays are read-only memory maps of the file, so that loading takes constant time and memory, and the operations are a StoredOperations sequence, which only builds an operation when it is first used. Gate counts, swap counts and the depth follow from arrays_count_ops() and arrays_depth() without building any operations; arrays_to_circuit() converts to a QuantumCircuit when needed.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(routed_magic)) != routed_magic:
+            raise ValueError("{} is not a routed circuit file.".format(path))
+        size = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(size))
+    if header["version"] != routed_version:
+        raise ValueError(
+            "Unsupported routed circuit file version {}.".format(header["version"])
         )
-    )
-    print()
-    print(print_table, flush=True)
-    print("-" * 150)
-    print("}")
-    print()
+    start = len(routed_magic) + 8 + size
+    start += -start % routed_alignment
+    n = header["num_gates"]
+    if n > 0:
+        arrays = [
+            np.memmap(path, dtype="<i4", mode="r", offset=start + 4 * n * k, shape=(n,))
+            for k in range(4)
+        ]
+    else:
+        arrays = [np.empty(0, dtype=np.int32) for k in range(4)]
+    operations = StoredOperations(header["operations"], header["parameters"])
+    return GateArrays(*arrays, header["names"], operations, header["num_qubits"])
 
 
-def benchmark_against_OLSQ2(lg, p, obj_is_swap=False):
+def process_context(*preload: str):
     """
-    Benchmark against OLSQ2. Here, `lg` is the line graph on which a quantum simulation circuit is constructed and `p` is the number of Trotter steps in the circuit.
+    Return the multiprocessing context used to start worker processes. Forking a process after Qiskit has started its thread pools can deadlock the child, so where possible, workers are forked from a server process that has only imported this module and the modules named in `preload`. The server is started once, so only the modules named at the first start of a worker are preloaded.
     """
-    import sys
-
-    sys.path.insert(1, "OLSQ2")
-    from olsq import OLSQ
-    from olsq.device import qcdevice
-
-    qc = heis_circuit(lg, p, cnot_circ=True)
-
-    # Route with line graph routing
-    start = time()
-    rqc = line_graph_route(qc)
-    end = time()
-
-    lgr_result = {
-        "depth": rqc.depth(),
-        "num_swaps": rqc.count_ops()["swap"],
-        "num_qubits": rqc.num_qubits,
-        "wall_clock": end - start,
-    }
-
-    print(lgr_result)
+    if "forkserver" in mp.get_all_start_methods():
+        context = mp.get_context("forkserver")
+        context.set_forkserver_preload(["line_graph_routing", *preload])
+        return context
+    return mp.get_context("spawn")
 
-    # Route same circuit with OLSQ2
-    print("Routing the same circuit with OLSQ2")
-    cg = coupling_graph(rqc)
-    cg = nx.convert_node_labels_to_integers(cg)
 
-    mode = "normal"
-    encoding = 1
-    solver = OLSQ(obj_is_swap, mode, encoding)
-
-    qasm = qc.qasm()
-    solver.setprogram(qasm)
+def route_with_plan(plan: RoutingPlan, circuits, period: int = None) -> list:
+    """
+    Return the line-graph routed circuits of the list `circuits`, which must all have the coupling graph of the RoutingPlan plan. Used by line_graph_route_many() to route a chunk of circuits in a worker process.
+    """
+    return [line_graph_route(qc, period=period, plan=plan) for qc in circuits]
 
-    n = cg.number_of_nodes()
-    connection = list(cg.edges())
-    swap_duration = 1
-    device = qcdevice("kagome", n, connection, swap_duration)
-    solver.setdevice(device)
-    use_sabre = True
-    result = solver.solve(use_sabre)
 
-    print(result)
+def line_graph_route_many(
+    circuits, workers: int = None, chunksize: int = None, period: int = None
+) -> list:
+    """
+    Line-graph route all QuantumCircuits in `circuits` and return the routed circuits in the same order. The circuits are grouped by coupling_graph_key(), which also distinguishes the order of the nodes and edges of their coupling graphs, so that the heavy graph is built once per group and every circuit is routed as by line_graph_route(qc), and the groups are routed in chunks of `chunksize` circuits by a pool of `workers` processes (by default, one per CPU). If chunksize is None, every group is split in about four chunks per worker. With workers=1, all circuits are routed in the current process. The argument `period` is passed on to line_graph_route().
+    """
+    circuits = list(circuits)
+    if workers is None:
+        workers = os.cpu_count()
+
+    groups = OrderedDict()
+    for k, qc in enumerate(circuits):
+        cg = coupling_graph(qc)
+        key = coupling_graph_key(cg)
+        if key not in groups:
+            groups[key] = (RoutingPlan(cg), [])
+        groups[key][1].append(k)
+
+    tasks = []
+    for plan, indices in groups.values():
+        size = chunksize or max(1, -(-len(indices) // (4 * workers)))
+        for start in range(0, len(indices), size):
+            tasks.append((plan, indices[start : start + size]))
+
+    results = [None] * len(circuits)
+    if workers == 1:
+        for plan, indices in tasks:
+            routed = route_with_plan(plan, [circuits[k] for k in indices], period)
+            for k, qc in zip(indices, routed):
+                results[k] = qc
+        return results
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=process_context()) as pool:
+        futures = [
+            (
+                indices,
+                pool.submit(
+                    route_with_plan, plan, [circuits[k] for k in indices], period
+                ),
+            )
+            for plan, indices in tasks
+        ]
+        for indices, future in futures:
+            for k, qc in zip(indices, future.result()):
+                results[k] = qc
+    return results
+
+
+# The lattice generators, drawing and benchmarking functions live in separate modules, which are only imported when one of their functions is first accessed as an attribute of this module (as in lgr.kagome). This keeps matplotlib, scipy, tabulate and the Qiskit transpiler out of the import of the routing code.
+lazy_modules = {
+    "lgr_lattices": [
+        "kagome",
+        "shuriken",
+        "checkerboard",
+        "heavy_square",
+        "lattice_output",
+        "kagome_lattice",
+        "heavy_square_lattice",
+        "shuriken_lattice",
+        "checkerboard_lattice",
+        "lattice_cells",
+        "random_line_graph",
+        "random_circuit",
+        "pad_gate",
+        "prepare_singlet",
+        "heis_gate",
+        "edge_coloring",
+        "color_edges",
+        "augment_matching",
+        "periodic_colorings",
+        "lattice_coloring",
+        "heis_circuit",
+    ],
+    "lgr_drawing": ["draw_edge_coloring"],
+    "lgr_benchmark": [
+        "benchmark_circuit",
+        "get_num_swaps",
+        "benchmark_line_graph",
+        "routing_pass_manager",
+        "seed_pass_manager",
+        "benchmark_repetition",
+        "bootstrap_intervals",
+        "benchmark_row",
+        "TIMED_OUT",
+        "run_worker",
+        "run_tasks",
+        "BENCHMARK_DEFAULTS",
+        "benchmark_many",
+        "benchmark",
+        "setting_key",
+        "to_json",
+        "store_result",
+        "load_results",
+        "run_sweep",
+        "import_pickled_results",
+        "print_benchmark",
+        "benchmark_against_OLSQ2",
+    ],
+}
+lazy_names = {name: module for module, names in lazy_modules.items() for name in names}
+
+
+def __getattr__(name):
+    if name not in lazy_names:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(lazy_names[name]), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(lazy_names))
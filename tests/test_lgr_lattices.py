@@ -0,0 +1,51 @@
+# Checks of the lattice generators. Run with: python -m pytest tests
+import os
+import sys
+import networkx as nx
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import lgr_lattices as lat
+
+generators = [
+    (lat.kagome, lat.kagome_lattice),
+    (lat.shuriken, lat.shuriken_lattice),
+    (lat.checkerboard, lat.checkerboard_lattice),
+    (lat.heavy_square, lat.heavy_square_lattice),
+]
+sizes = [(n, m) for n in range(1, 5) for m in range(1, 4)]
+
+
+def test_isomorphic():
+    # The array-based generators give the same graphs as the networkx generators, up to the labels of the nodes.
+    for graph, lattice in generators:
+        for n, m in sizes:
+            assert nx.is_isomorphic(graph(n, m), lattice(n, m, "networkx")), (
+                lattice.__name__,
+                n,
+                m,
+            )
+
+
+def test_csr():
+    # The adjacency matrix holds both orientations of every edge.
+    for graph, lattice in generators:
+        for n, m in sizes:
+            edges = lattice(n, m)
+            csr = lattice(n, m, "csr")
+            assert csr.nnz == 2 * len(edges)
+            assert csr.nnz == 2 * graph(n, m).number_of_edges()
+            assert (csr != csr.T).nnz == 0
+
+
+def test_lattice_coloring():
+    # Color 0 is a maximum matching and at most one more color than the maximum degree is used.
+    for graph, lattice in generators:
+        name = lattice.__name__[: -len("_lattice")]
+        for n, m in sizes:
+            g = lat.lattice_coloring(name, n, m)
+            colors = nx.get_edge_attributes(g, "color")
+            matching = [e for e, c in colors.items() if c == 0]
+            assert nx.is_matching(g, matching)
+            assert len(matching) == len(nx.max_weight_matching(g, maxcardinality=True))
+            degree = max(d for _, d in g.degree)
+            assert len(set(colors.values())) <= degree + 1, (name, n, m)
@@ -0,0 +1,231 @@
+# Checks of line-graph routing. Run with: python -m pytest tests
+import os
+import random
+import sys
+from functools import reduce
+import networkx as nx
+import numpy as np
+from qiskit import QuantumCircuit
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+import line_graph_routing as lgr
+
+
+def random_circuit(g, seed):
+    # A random circuit of cx gates on the edges of g, acting on every edge first, in a random order.
+    rng = random.Random(seed)
+    edges = list(g.edges)
+    rng.shuffle(edges)
+    qc = QuantumCircuit(g.number_of_nodes())
+    for a, b in edges + [rng.choice(edges) for _ in range(20)]:
+        if rng.random() < 0.5:
+            a, b = b, a
+        qc.cx(a, b)
+    return qc
+
+
+def lone_leaf(g, node):
+    # The original test of whether `node` is a lone leaf of g: a node of degree one whose neighbour is not connected to any other nodes of degree one.
+    assert g.has_node(node)
+    if g.degree[node] != 1:
+        return False
+    nbr = list(nx.neighbors(g, node))[0]
+    lone_sibs = [sib for sib in nx.neighbors(g, nbr) if g.degree[sib] == 1]
+    assert len(lone_sibs) >= 1
+    return len(lone_sibs) == 1
+
+
+def test_lone_leaves():
+    # lone_leaves() finds the same lone leaves as lone_leaf(), on heavy graphs and on random trees, which have nodes with several leaves.
+    graphs = [
+        lgr.routing_plan(coupling_graph).h
+        for coupling_graph in [
+            nx.convert_node_labels_to_integers(lgr.kagome(n, m))
+            for n, m in [(1, 1), (2, 1), (2, 3)]
+        ]
+    ]
+    rng = random.Random(0)
+    for size in range(1, 30):
+        tree = nx.Graph()
+        tree.add_node(0)
+        tree.add_edges_from((k, rng.randrange(k)) for k in range(1, size))
+        graphs.append(tree)
+    for g in graphs:
+        num_qubits = max(g.nodes) + 2
+        is_lone, leaf_nbr = lgr.lone_leaves(g, num_qubits)
+        for node in range(num_qubits):
+            lone = g.has_node(node) and lone_leaf(g, node)
+            assert is_lone[node] == lone
+            assert leaf_nbr[node] == (next(iter(g[node])) if lone else -1)
+
+
+def test_plan_cache():
+    # Routing with a plan cached for another circuit with the same coupling graph gives the same circuit as routing with an empty cache.
+    g = nx.convert_node_labels_to_integers(lgr.kagome(1, 1))
+    for seed in range(10):
+        a = random_circuit(g, 2 * seed)
+        b = random_circuit(g, 2 * seed + 1)
+        lgr.plan_cache.clear()
+        cold = lgr.line_graph_route(b)
+        lgr.plan_cache.clear()
+        lgr.line_graph_route(a)
+        assert lgr.line_graph_route(b) == cold
+
+
+def test_route_many():
+    # Routing circuits with the same coupling graph in a batch gives the same circuits as routing them one by one.
+    g = nx.convert_node_labels_to_integers(lgr.kagome(1, 1))
+    circuits = [random_circuit(g, seed) for seed in range(8)]
+    single = []
+    for qc in circuits:
+        lgr.plan_cache.clear()
+        single.append(lgr.line_graph_route(qc))
+    assert lgr.line_graph_route_many(circuits, workers=1) == single
+
+
+def test_periodic_stats():
+    # Periodic routing reports the same counts of the output circuit as routing the whole circuit.
+    g = lgr.lattice_coloring("kagome", 2, 2)
+    qc = lgr.heis_circuit(g, 8)
+    counts = []
+    for period in [None, g.number_of_edges()]:
+        stats = lgr.RoutingStats()
+        out = lgr.line_graph_route(qc, period=period, stats=stats)
+        assert stats.counts["swaps out"] == out.count_ops()["swap"]
+        counts.append(
+            [
+                stats.counts[name]
+                for name in ["gates in", "gates out", "swaps out", "qubits dropped"]
+            ]
+        )
+    assert counts[0] == counts[1]
+
+
+def test_route_arrays():
+    # Routing GateArrays gives the same circuit as routing the circuit, and does not change the input.
+    g = nx.convert_node_labels_to_integers(lgr.kagome(1, 1))
+    qc = random_circuit(g, 0)
+    ga = lgr.circuit_to_arrays(qc)
+    names = list(ga.names)
+    routed = lgr.line_graph_route_arrays(ga)
+    assert ga.names == names
+    assert lgr.arrays_to_circuit(routed, compact=True) == lgr.line_graph_route(qc)
+
+
+def simulate(qc, state):
+    # Apply the gates of qc to `state`, an array with an axis of size 2 for every qubit of qc.
+    for operation, qubits in lgr.circuit_gates(qc):
+        k = len(qubits)
+        matrix = operation.to_matrix().reshape((2,) * 2 * k)
+        # Qiskit orders the qubits of a gate matrix from the last to the first.
+        axes = list(qubits[::-1])
+        state = np.tensordot(matrix, state, axes=(list(range(k, 2 * k)), axes))
+        state = np.moveaxis(state, list(range(k)), axes)
+    return state
+
+
+def check_layout(qc, **kwargs):
+    # Simulate the routed circuit on a random product state placed by the initial layout, and compare the state placed back by the final layout to that of qc.
+    routed, layout = lgr.line_graph_route(qc, return_layout=True, **kwargs)
+    assert lgr.line_graph_route(qc, **kwargs) == routed
+    rng = np.random.default_rng(0)
+    vectors = [rng.normal(size=2) + 1j * rng.normal(size=2) for _ in qc.qubits]
+    zero = np.array([1, 0], dtype=complex)
+    placed = [zero] * routed.num_qubits
+    for x, q in enumerate(layout.initial):
+        placed[q] = vectors[x]
+    state = simulate(routed, reduce(np.multiply.outer, placed))
+    rest = [q for q in range(routed.num_qubits) if q not in set(layout.final)]
+    state = np.transpose(state, list(layout.final) + rest)
+    expected = simulate(qc, reduce(np.multiply.outer, vectors))
+    expected = reduce(np.multiply.outer, [expected] + [zero] * len(rest))
+    assert np.allclose(state, expected), (kwargs, layout)
+
+
+def test_layout():
+    # The layout returned by line_graph_route() maps the routed circuit to the input, also if the input contains swaps.
+    qc = QuantumCircuit(3)
+    qc.cx(0, 1)
+    qc.cx(1, 2)
+    qc.cx(0, 2)
+    qc.swap(0, 1)
+    qc.cx(0, 2)
+    qc.cx(1, 2)
+    qc.cx(0, 1)
+    circuits = [qc]
+    g = nx.convert_node_labels_to_integers(lgr.kagome(1, 1))
+    for seed in range(6):
+        rng = random.Random(seed)
+        qc = random_circuit(g, seed)
+        edges = list(g.edges)
+        for _ in range(10):
+            a, b = rng.choice(edges)
+            qc.swap(a, b)
+            qc.rx(rng.random(), a)
+        # Swaps at the end, including the swap_gate that routing inserts.
+        qc.swap(*edges[0])
+        qc.append(lgr.swap_gate, edges[1])
+        circuits.append(qc)
+    for qc in circuits:
+        for kwargs in [{}, {"fused": False}, {"lazy": True}, {"layered": True}]:
+            check_layout(qc, **kwargs)
+
+
+def wires(qc):
+    # The gates on every qubit of qc, in order.
+    gates = {}
+    for operation, qubits in lgr.circuit_gates(qc):
+        for q in qubits:
+            gates.setdefault(q, []).append((operation.name, qubits))
+    return gates
+
+
+def swap_chain_circuits():
+    # Random circuits on kagome(1, 1) with swaps, ending with chains of swaps.
+    g = nx.convert_node_labels_to_integers(lgr.kagome(1, 1))
+    edges = list(g.edges)
+    qc = QuantumCircuit(g.number_of_nodes())
+    for a, b in edges:
+        qc.cx(a, b)
+    qc.swap(4, 7)
+    qc.swap(7, 5)
+    yield qc
+    for seed in range(100):
+        rng = random.Random(seed)
+        qc = QuantumCircuit(g.number_of_nodes())
+        for a, b in edges:
+            qc.cx(a, b)
+        for _ in range(rng.randrange(30)):
+            a, b = rng.choice(edges)
+            if rng.random() < 0.5:
+                qc.swap(a, b)
+            else:
+                qc.cx(a, b)
+        for _ in range(rng.randrange(6)):
+            qc.swap(*rng.choice(edges))
+        yield qc
+
+
+def test_session():
+    # A RoutingSession gives the same circuit as line_graph_route(), also after every append.
+    for seed, qc in enumerate(swap_chain_circuits()):
+        gates = list(lgr.circuit_gates(qc))
+        session = lgr.RoutingSession(lgr.coupling_graph(qc))
+        cuts = sorted(random.Random(seed).sample(range(len(gates)), 2))
+        for start, end in zip([0] + cuts, cuts + [len(gates)]):
+            session.append(gates[start:end])
+            part = lgr.gates_to_circuit(gates[:end], qc.num_qubits)
+            routed = lgr.line_graph_route(part, plan=session.plan)
+            assert session.circuit().num_qubits == routed.num_qubits
+            assert wires(session.circuit()) == wires(routed)
+
+
+def test_stream():
+    # Streaming gives the same circuit as line_graph_route().
+    for qc in swap_chain_circuits():
+        plan = lgr.routing_plan(lgr.coupling_graph(qc))
+        gates = lgr.line_graph_route_stream(lgr.circuit_gates(qc), plan=plan)
+        streamed = lgr.gates_to_circuit(gates, plan.num_qubits)
+        assert wires(lgr.remove_idle_qwires(streamed)) == wires(
+            lgr.line_graph_route(qc, plan=plan)
+        )